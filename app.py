@@ -1,3 +1,4 @@
+import atexit
 import logging
 from typing import Dict, Any
 
@@ -17,6 +18,8 @@ app.config.from_object(Config)
 
 # 初始化问答系统
 qa_system = TimeSeriesQA(Config())
+# 进程退出前等待后台写库任务完成
+atexit.register(qa_system.shutdown)
 
 # 定义financial文件夹路径
 FINANCIAL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data/knowledge_base')
@@ -288,12 +291,15 @@ def get_session_messages(session_id):
             session_id: 会话唯一标识（必传，从URL路径中获取）
         URL查询参数：
             limit: 返回消息的最大数量（可选，默认值100，需为整数）
+            metadata_fields: 仅返回的元数据字段，逗号分隔（可选，如 "knowledge_base,timestamp"）
     返回：JSON响应，包含success状态、session_id、messages消息列表、count消息总数
     异常：捕获所有处理过程中的异常，记录日志并返回包含错误信息的JSON响应（状态码500）
     """
     try:
         limit = request.args.get('limit', 100, type=int)
-        messages = qa_system.get_session_messages(session_id, limit)
+        metadata_fields = request.args.get('metadata_fields', '')
+        metadata_fields = [f.strip() for f in metadata_fields.split(',') if f.strip()] or None
+        messages = qa_system.get_session_messages(session_id, limit, metadata_fields)
 
         return jsonify({
             'success': True,
@@ -8,11 +8,49 @@ class Config:
     # 模型配置
     EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "BAAI/bge-large-zh-v1.5")
     LLM_MODEL = os.getenv("LLM_MODEL", "qwen")
+    # 嵌入向量维度（bge-large-zh-v1.5 为 1024）
+    EMBEDDING_DIMENSION = int(os.getenv("EMBEDDING_DIMENSION", 1024))
+    # 每次送入嵌入模型的文本条数
+    EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", 32))
+    # 有可用 GPU 时嵌入模型以 autocast 半精度（BF16/FP16）编码；可选用 torch.compile 编译编码器（首次编码较慢）
+    EMBEDDING_FP16 = os.getenv("EMBEDDING_FP16", "true").lower() == "true"
+    EMBEDDING_TORCH_COMPILE = os.getenv("EMBEDDING_TORCH_COMPILE", "false").lower() == "true"
+
+    # FAISS 向量索引类型: hnsw（近似图索引，默认）/ flat（精确内积暴力检索，适合小规模语料）
+    #                     / ivfpq（倒排 + 乘积量化，适合大规模语料）
+    #                     / sq_fp16（精确检索，向量以 FP16 存储，内存与带宽减半）
+    #                     / sq8（精确检索，向量以 8 位标量量化存储，内存为 FP32 的 1/4）
+    VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "hnsw").lower()
+    # FAISS 向量索引配置（HNSW 图索引，内积度量 + 归一化向量即余弦相似度）
+    VECTOR_HNSW_M = int(os.getenv("VECTOR_HNSW_M", 32))
+    VECTOR_HNSW_EF_CONSTRUCTION = int(os.getenv("VECTOR_HNSW_EF_CONSTRUCTION", 200))
+    VECTOR_HNSW_EF_SEARCH = int(os.getenv("VECTOR_HNSW_EF_SEARCH", 64))
+    # IVF-PQ 索引配置：聚类中心数、PQ 子空间数与检索探测桶数；累计 30*聚类中心数 条向量后才训练，此前精确检索
+    VECTOR_IVF_NLIST = int(os.getenv("VECTOR_IVF_NLIST", 1024))
+    VECTOR_PQ_M = int(os.getenv("VECTOR_PQ_M", 64))
+    VECTOR_IVF_NPROBE = int(os.getenv("VECTOR_IVF_NPROBE", 16))
+    # SQ8 量化索引（sq8 及 HNSW-SQ8）训练各维取值范围所需的最少向量数，此前向量暂存于平坦索引并精确检索
+    VECTOR_SQ_MIN_TRAIN = int(os.getenv("VECTOR_SQ_MIN_TRAIN", 1000))
+    # 有 GPU 且安装 faiss-gpu 时把平坦 / IVF-PQ 索引复制到 GPU 检索（HNSW 与 sq_fp16 / sq8 仍在 CPU）；
+    # 向量数低于阈值时 CPU 更快，保持在 CPU
+    USE_GPU_FAISS = os.getenv("USE_GPU_FAISS", "false").lower() == "true"
+    GPU_FAISS_MIN_VECTORS = int(os.getenv("GPU_FAISS_MIN_VECTORS", 5000))
+    # 以只读内存映射方式加载 FAISS 索引（多进程共享页缓存、冷启动快）；之后的写入先复制为内存索引
+    MMAP_INDEX = os.getenv("MMAP_INDEX", "false").lower() == "true"
+    # VectorStore 检索结果 LRU 缓存条目数（按查询向量精确匹配）
+    VECTOR_SEARCH_CACHE_SIZE = int(os.getenv("VECTOR_SEARCH_CACHE_SIZE", 512))
+    # FAISS 未启用 AVX2/AVX-512 内核时直接报错（生产环境建议开启），否则只记录警告
+    FAISS_REQUIRE_SIMD = os.getenv("FAISS_REQUIRE_SIMD", "false").lower() == "true"
+    # HNSW 索引是否以 8 位标量量化（SQ8）存储向量，内存约为 FP32 的 1/4，召回率略有损失；
+    # 累计 VECTOR_SQ_MIN_TRAIN 条向量后才训练并建图
+    VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "false").lower() == "true"
 
     # OpenAI配置
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
     OPENAI_API_BASE = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
     OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+    # 前缀缓存由推理服务端启动参数控制（vLLM: --enable-prefix-caching；SGLang 默认开启 RadixAttention），
+    # 不是请求参数；流式回答的系统提示跨轮次保持不变，服务端开启后即可复用其 KV 缓存
 
     # 通义千问配置
     TONGYI_API_KEY = os.getenv("TONGYI_API_KEY")
@@ -40,8 +78,30 @@ class Config:
     SEARCH_RESULTS_COUNT = int(os.getenv("SEARCH_RESULTS_COUNT", 5))
     TOP_K = SEARCH_RESULTS_COUNT
     SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", 0.5))
+    # 查询向量缓存与检索结果缓存的条目数上限
+    SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", 256))
+    SEARCH_RESULTS_CACHE_SIZE = int(os.getenv("SEARCH_RESULTS_CACHE_SIZE", 2048))
+    # 语义查询缓存：与历史查询的余弦相似度不低于阈值时复用其检索结果（随 ANSWER_CACHE_SEMANTIC 开启）
+    SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", 4096))
+    SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.97))
+    # 回答缓存：完全相同的问题（精确匹配）在有效期内直接复用已生成的回答
+    ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+    ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", 1024))
+    ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", 600))
+    # 语义相近的问题（余弦相似度不低于阈值）也复用回答与检索结果；只差年份、条款号或主体的问题向量也很接近，
+    # 会得到错误的回答或其他问题的文档，默认关闭
+    ANSWER_CACHE_SEMANTIC = os.getenv("ANSWER_CACHE_SEMANTIC", "false").lower() == "true"
+    ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", 0.95))
     # 在 Config 类中添加
     FILE_HASH_DB = os.path.join(DATA_PATH, "file_hashes.json")
+    # 构建知识库时并行解析文件的进程数（1 表示在当前进程中串行解析）。
+    # 大于 1 时仅用于离线构建脚本：Windows 的 spawn 子进程会重新导入主模块（app.py 在导入时即创建问答系统），
+    # Linux 上则会 fork 多线程的服务进程
+    FILE_LOAD_WORKERS = int(os.getenv("FILE_LOAD_WORKERS", 1))
+    # 向 ChromaDB 写入时每批的文档数，过大的单次写入会拖慢序列化和事务提交
+    CHROMA_ADD_BATCH_SIZE = int(os.getenv("CHROMA_ADD_BATCH_SIZE", 200))
+    # 构建知识库时每批生成嵌入的文本块数，下一批嵌入计算与当前批写入并行进行
+    EMBEDDING_PIPELINE_BATCH_SIZE = int(os.getenv("EMBEDDING_PIPELINE_BATCH_SIZE", 256))
 
 
     # 联网搜索配置（必应国内版）
@@ -50,6 +110,14 @@ class Config:
     WEB_SEARCH_MKT = os.getenv("WEB_SEARCH_MKT", "zh-CN")
     WEB_SEARCH_TOPN = int(os.getenv("WEB_SEARCH_TOPN", 3))
     WEB_SEARCH_TIMEOUT = int(os.getenv("WEB_SEARCH_TIMEOUT", 8))
+    # 联网搜索结果缓存（条目数与有效期秒数）
+    WEB_SEARCH_CACHE_SIZE = int(os.getenv("WEB_SEARCH_CACHE_SIZE", 1024))
+    WEB_SEARCH_CACHE_TTL = int(os.getenv("WEB_SEARCH_CACHE_TTL", 3600))
+    # 预期的并发问答请求数，用于确定回答前准备工作线程池的大小
+    MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", 16))
+    # 回答准备结果（检索、知识库分析、模板、联网搜索）短期缓存，供普通问答与流式回答共用
+    PIPELINE_CACHE_SIZE = int(os.getenv("PIPELINE_CACHE_SIZE", 512))
+    PIPELINE_CACHE_TTL = int(os.getenv("PIPELINE_CACHE_TTL", 60))
 
 
     # Flask配置
@@ -69,6 +137,8 @@ class Config:
     MYSQL_USER = os.getenv('MYSQL_USER', 'root')
     MYSQL_PASSWORD = os.getenv('MYSQL_PASSWORD', 'root')
     MYSQL_DATABASE = os.getenv('MYSQL_DATABASE', 'knowledge_base_chat')
+    # 连接池大小（mysql-connector 上限为 32），需覆盖并发请求数与后台写入线程数
+    MYSQL_POOL_SIZE = int(os.getenv('MYSQL_POOL_SIZE', 16))
 
     @classmethod
     def ensure_directories_exist(cls):
@@ -1,7 +1,9 @@
 import numpy as np
-from typing import List, Dict, Any
+from contextlib import ExitStack
+from typing import List, Dict, Any, Tuple
 import os
 import pandas as pd
+import torch
 from sentence_transformers import SentenceTransformer
 from config import Config  # 正确的导入方式
 
@@ -21,8 +23,15 @@ class DataProcessor:
         """延迟加载模型"""
         if self.model is None:
             print("正在加载嵌入模型...")
-            self.model = SentenceTransformer(self.model_name)
-            print("模型加载完成")
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+            self.model = SentenceTransformer(self.model_name, device=device)
+            if device == "cuda":
+                # 权重保持 FP32，半精度只在 generate_embeddings 中通过 autocast 作用于矩阵乘，
+                # LayerNorm / Softmax 等数值敏感算子仍按 FP32 计算
+                if Config.EMBEDDING_TORCH_COMPILE:
+                    # 只编译底层 transformer，分词和池化仍走 SentenceTransformer 原流程
+                    self.model[0].auto_model = torch.compile(self.model[0].auto_model, mode="reduce-overhead")
+            print(f"模型加载完成（设备: {device}）")
 
     def check_existing_documents(self, vector_store, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
@@ -224,29 +233,56 @@ class DataProcessor:
         print(f"文档分块完成，共 {len(chunks)} 个块")
         return chunks
 
-    def generate_embeddings(self, texts: List[str]) -> np.ndarray:
-        """生成文本嵌入向量"""
+    def chunk_documents_soa(self, contents: List[str], sources: List[str], chunk_size: int = 500,
+                            chunk_overlap: int = 50) -> Tuple[List[str], List[str], List[int]]:
+        """将文档分块（按列传入/返回），结果为三个等长列表: 块文本、来源、块序号
+
+        分块规则与 chunk_documents 一致，块序号在所有文档间连续编号。
+        """
+        chunk_texts = []
+        chunk_sources = []
+        step = chunk_size - chunk_overlap
+
+        for content, source in zip(contents, sources):
+            # 简单的文本分块
+            words = content.split()
+            for i in range(0, len(words), step):
+                chunk_texts.append(" ".join(words[i:i + chunk_size]))
+                chunk_sources.append(source)
+
+        print(f"文档分块完成，共 {len(chunk_texts)} 个块")
+        return chunk_texts, chunk_sources, list(range(len(chunk_texts)))
+
+    def generate_embeddings(self, texts: List[str], batch_size: int = None) -> np.ndarray:
+        """生成文本嵌入向量（按 batch_size 分批送入编码器）"""
         self._load_model()  # 确保模型已加载
+        if batch_size is None:
+            batch_size = Config.EMBED_BATCH_SIZE
 
         print(f"正在为 {len(texts)} 个文本生成嵌入...")
-        embeddings = self.model.encode(texts)
+        with self._inference_context():
+            embeddings = np.asarray(
+                self.model.encode(texts, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False),
+                dtype=np.float32
+            )
         print("嵌入生成完成")
         return embeddings
 
+    def _inference_context(self):
+        """编码时的推理上下文：GPU 上启用 autocast（Ampere 及以上用 BF16，否则 FP16），CPU 上保持 FP32"""
+        stack = ExitStack()
+        stack.enter_context(torch.inference_mode())
+        if Config.EMBEDDING_FP16 and self.model.device.type == "cuda":
+            dtype = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+            stack.enter_context(torch.autocast(device_type="cuda", dtype=dtype))
+        return stack
+
     def _load_pdf_file(self, file_path: str) -> str:
         """加载PDF文件文本。优先抽取文本型PDF；扫描件建议结合OCR（可后续增强）。"""
         try:
-            import pdfplumber
+            texts = self._extract_pdf_texts(file_path)
         except ImportError:
-            return f"错误: 未安装 pdfplumber，无法读取PDF文件 {os.path.basename(file_path)}"
-
-        texts = []
-        try:
-            with pdfplumber.open(file_path) as pdf:
-                for page in pdf.pages:
-                    page_text = page.extract_text() or ''
-                    if page_text.strip():
-                        texts.append(page_text)
+            return f"错误: 未安装 PyMuPDF 或 pdfplumber，无法读取PDF文件 {os.path.basename(file_path)}"
         except Exception as e:
             return f"读取PDF文件出错: {str(e)}"
 
@@ -260,6 +296,30 @@ class DataProcessor:
             return header + "(未从PDF中提取到文本，且OCR回退失败。请检查PaddleOCR/显卡驱动/依赖安装。)"
         return header + body
 
+    def _extract_pdf_texts(self, file_path: str) -> List[str]:
+        """逐页抽取PDF文本，返回非空页文本列表；优先使用 PyMuPDF（原生 MuPDF 实现），未安装时回退到 pdfplumber"""
+        try:
+            import fitz  # PyMuPDF
+        except ImportError:
+            fitz = None
+
+        texts = []
+        if fitz is not None:
+            with fitz.open(file_path) as pdf:
+                for page in pdf:
+                    page_text = page.get_text() or ''
+                    if page_text.strip():
+                        texts.append(page_text)
+            return texts
+
+        import pdfplumber
+        with pdfplumber.open(file_path) as pdf:
+            for page in pdf.pages:
+                page_text = page.extract_text() or ''
+                if page_text.strip():
+                    texts.append(page_text)
+        return texts
+
     def _ensure_paddle_ocr(self):
         """确保 PaddleOCR 可用（按需安装）。"""
         flag_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.paddle_installed')
@@ -307,6 +367,7 @@ class DataProcessor:
 
         try:
             import fitz  # PyMuPDF
+            import cv2
             from paddleocr import PaddleOCR
         except Exception:
             return ''
@@ -327,8 +388,6 @@ class DataProcessor:
                 img_bytes = pix.tobytes('png')
 
                 # 将字节喂给 OCR（PaddleOCR 支持 numpy 数组/路径；这里用临时字节转换）
-                import numpy as np
-                import cv2
                 nparr = np.frombuffer(img_bytes, np.uint8)
                 img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
                 if img is None:
@@ -351,4 +410,17 @@ class DataProcessor:
 
             return "\n\n".join(page_texts).strip()
         except Exception:
-            return ''
\ No newline at end of file
+            return ''
+
+
+# 加载文件的子进程内复用的数据处理器（只用于解析文件，不加载嵌入模型）
+_worker_processor = None
+
+
+def load_file_in_worker(task):
+    """在进程池中加载单个文件；放在本模块以免子进程导入 qa_system 及其 ChromaDB/MySQL 依赖"""
+    global _worker_processor
+    file_path, model_name, loader_name = task
+    if _worker_processor is None:
+        _worker_processor = DataProcessor(model_name=model_name)
+    return getattr(_worker_processor, loader_name)(file_path)
@@ -9,17 +9,19 @@ import logging
 
 
 class DatabaseManager:
-    def __init__(self, config: dict):
+    def __init__(self, config: dict, pool_size: int = 5):
         self.config = config
-        self.pool = self._create_connection_pool()
+        self.pool_size = pool_size
+        # logger 需在创建连接池之前就绪，连接池创建失败时才能记录错误
         self.logger = logging.getLogger(__name__)
+        self.pool = self._create_connection_pool()
 
     def _create_connection_pool(self):
         """创建数据库连接池"""
         try:
             pool = pooling.MySQLConnectionPool(
                 pool_name="chat_pool",
-                pool_size=5,
+                pool_size=self.pool_size,
                 **self.config
             )
             return pool
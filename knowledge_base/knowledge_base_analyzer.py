@@ -1,9 +1,14 @@
+import heapq
 import os
+import re
 import json
 import pandas as pd
 from typing import Dict, List, Any
 from datetime import datetime
 
+# 年份匹配（简单匹配 20xx 形式的4位数字）
+_YEAR_RE = re.compile(r'\b(20\d{2})\b')
+
 
 class KnowledgeBaseAnalyzer:
     def __init__(self, config=None):
@@ -153,10 +158,9 @@ class KnowledgeBaseAnalyzer:
                     print(f"分析文件 {file_path} 时出错: {e}")
                     continue
 
-        # 按词频排序
+        # 按词频取前20个（部分选择，无需对全部词排序）
         content_stats["word_frequency"] = dict(
-            sorted(content_stats["word_frequency"].items(),
-                   key=lambda x: x[1], reverse=True)[:20]  # 取前20个
+            heapq.nlargest(20, content_stats["word_frequency"].items(), key=lambda x: x[1])
         )
 
         return content_stats
@@ -217,8 +221,7 @@ class KnowledgeBaseAnalyzer:
                                 break
 
                         # 分析年份（简单匹配4位数字）
-                        import re
-                        year_matches = re.findall(r'\b(20\d{2})\b', content)
+                        year_matches = _YEAR_RE.findall(content)
                         if year_matches:
                             year = year_matches[0]
                             if year in case_stats["cases_by_year"]:
@@ -270,16 +273,20 @@ class KnowledgeBaseAnalyzer:
                     print("请安装 python-docx 包以支持 .docx 文件读取")
                     return ""
             elif file_ext == '.pdf':
+                # 优先使用 PyMuPDF（原生实现，远快于纯 Python 的 PyPDF2），未安装时回退到 PyPDF2
+                try:
+                    import fitz
+                    with fitz.open(file_path) as pdf:
+                        return "".join(page.get_text() + "\n" for page in pdf)
+                except ImportError:
+                    pass
                 try:
                     import PyPDF2
                     with open(file_path, 'rb') as f:
                         reader = PyPDF2.PdfReader(f)
-                        text = ""
-                        for page in reader.pages:
-                            text += page.extract_text() + "\n"
-                        return text
+                        return "".join((page.extract_text() or "") + "\n" for page in reader.pages)
                 except ImportError:
-                    print("请安装 PyPDF2 包以支持 .pdf 文件读取")
+                    print("请安装 PyMuPDF 或 PyPDF2 包以支持 .pdf 文件读取")
                     return ""
             else:
                 # 尝试以文本方式读取其他文件
@@ -299,14 +306,14 @@ class KnowledgeBaseAnalyzer:
                         f"{stats['content_statistics']['total_documents']} 个文档，"
                         f"共 {stats['content_statistics']['total_words']} 个词",
             "case_summary": f"共发现 {stats['case_statistics']['total_cases']} 个案件",
-            "main_file_types": dict(sorted(
-                stats['file_statistics']['files_by_extension'].items(),
-                key=lambda x: x[1], reverse=True
-            )[:5]),  # 前5个文件类型
-            "main_case_types": dict(sorted(
-                stats['case_statistics']['cases_by_type'].items(),
-                key=lambda x: x[1], reverse=True
-            )[:5]) if stats['case_statistics']['cases_by_type'] else "无案件数据"
+            "main_file_types": dict(heapq.nlargest(
+                5, stats['file_statistics']['files_by_extension'].items(),
+                key=lambda x: x[1]
+            )),  # 前5个文件类型
+            "main_case_types": dict(heapq.nlargest(
+                5, stats['case_statistics']['cases_by_type'].items(),
+                key=lambda x: x[1]
+            )) if stats['case_statistics']['cases_by_type'] else "无案件数据"
         }
         return summary
 
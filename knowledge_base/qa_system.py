@@ -1,21 +1,362 @@
+import logging
+import mmap
 import os
 import shutil
+import hashlib
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from datetime import datetime
+from functools import lru_cache
+from queue import Full, Queue
 
 import chromadb
-from typing import List, Dict, Any
+import faiss
+import numpy as np
+from typing import List, Dict, Any, Optional
 import re
 import html
 
 from chromadb import Settings
 
-from knowledge_base.data_processing import DataProcessor
+from knowledge_base.data_processing import DataProcessor, load_file_in_worker
 from knowledge_base.database_manager import DatabaseManager
 from knowledge_base.knowledge_base_analyzer import KnowledgeBaseAnalyzer
 from knowledge_base.llm_providers import LLMProvider
 from config import Config
 import requests
+from requests.adapters import HTTPAdapter
 import json
+import orjson
+import xxhash
+from cachetools import LRUCache, TTLCache
+
+
+logger = logging.getLogger(__name__)
+
+# 联网搜索请求使用的浏览器标识
+_WEB_SEARCH_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0 Safari/537.36'
+
+# 元数据字段名只允许字母、数字和下划线，避免拼接进 JSON 路径时被注入
+_METADATA_FIELD_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+# 必应搜索结果页解析用的正则
+_BING_H2_RE = re.compile(r'<h2[^>]*>.*?<a[^>]*href="([^"]*)"[^>]*>([^<]+)</a>.*?</h2>', re.DOTALL)
+_BING_ALGO_RE = re.compile(r'<li class=\"b_algo\"[\s\S]*?<h2>[\s\S]*?<a href=\"(.*?)\"[^>]*>([\s\S]*?)</a>[\s\S]*?</h2>[\s\S]*?(?:<p[^>]*>([\s\S]*?)</p>)?')
+_BING_A_RE = re.compile(r'<a href=\"(https?://[^\"]+)\"[^>]*>([\s\S]*?)</a>')
+_HTML_TAG_RE = re.compile(r'<.*?>')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# 问题关键词提取用的中文词汇正则
+_CJK_RE = re.compile(r'[\u4e00-\u9fff]+')
+_CJK_2_4_RE = re.compile(r'[\u4e00-\u9fff]{2,4}')
+_CJK_2_6_RE = re.compile(r'[\u4e00-\u9fff]{2,6}')
+_CJK_5_PLUS_RE = re.compile(r'[\u4e00-\u9fff]{5,}')
+
+# 会话消息查询语句，模块级常量保证每次调用下发的 SQL 文本完全一致
+_SELECT_SESSION_MESSAGES_SQL = """
+SELECT role, content, metadata, created_at
+FROM chat_messages
+WHERE session_id = %s
+ORDER BY created_at ASC
+LIMIT %s
+"""
+
+# 廉价的变更标记查询：消息条数 + 最新消息时间，用于判断会话消息缓存是否仍然有效
+_SESSION_MESSAGES_MARKER_SQL = """
+SELECT COUNT(*) AS message_count, MAX(created_at) AS last_created_at
+FROM chat_messages
+WHERE session_id = %s
+"""
+
+# 文件哈希记录的格式版本；哈希算法变更时递增，旧记录会在下次构建时整体失效一次
+_FILE_HASH_VERSION_KEY = "__version__"
+_FILE_HASH_VERSION = "xxh3_64-1"
+
+# 超过该大小的文件按块喂给哈希器，避免一次性扫过整个映射区
+_HASH_WHOLE_FILE_LIMIT = 64 * 1024 * 1024
+_HASH_BLOCK_SIZE = 1024 * 1024
+
+# 文件后缀 -> DataProcessor 中对应的加载方法
+_FILE_LOADERS = {
+    '.txt': '_load_text_file',
+    '.md': '_load_text_file',
+    '.rst': '_load_text_file',
+    '.markdown': '_load_text_file',
+    '.csv': '_load_csv_file',
+    '.xlsx': '_load_excel_file',
+    '.xls': '_load_excel_file',
+    '.docx': '_load_word_file',
+    '.doc': '_load_doc_file',
+    '.pdf': '_load_pdf_file',
+}
+
+# 进程内缓存的会话数上限
+_SESSION_MESSAGES_CACHE_SIZE = 256
+
+_SELECT_SESSION_MESSAGES_PROJECTED_SQL = """
+SELECT role, content, created_at{projections}
+FROM chat_messages
+WHERE session_id = %s
+ORDER BY created_at ASC
+LIMIT %s
+"""
+
+
+@lru_cache(maxsize=32)
+def _projected_session_messages_sql(fields: tuple) -> str:
+    """按字段组合生成（并缓存）投影查询语句，相同字段组合复用同一条 SQL 文本"""
+    projections = "".join(
+        f", JSON_UNQUOTE(JSON_EXTRACT(metadata, '$.{field}')) AS meta_{i}"
+        for i, field in enumerate(fields)
+    )
+    return _SELECT_SESSION_MESSAGES_PROJECTED_SQL.format(projections=projections)
+
+
+# 问句、虚词和常见动词，提取问题关键词时过滤
+_FUNCTION_STOP_WORDS = frozenset({
+    '什么', '如何', '怎么', '为什么', '哪个', '哪些', '是', '的', '了', '在', '有', '和', '与', '或', '但', '然而', '因此',
+    '所以', '因为', '如果', '当', '就', '都', '很', '非常', '比较', '更', '最', '还', '也', '又', '再', '已经', '正在',
+    '将要', '可以', '能够', '应该', '必须', '需要', '要求', '希望', '想要', '喜欢', '不喜欢', '认为', '觉得', '知道', '了解', '明白',
+    '理解', '学习', '研究', '分析', '讨论', '介绍', '说明', '解释', '描述', '总结', '概括',
+})
+
+# 过于宽泛的领域、职业和地名词汇，不作为核心概念或上下文关键词
+_TOPIC_STOP_WORDS = frozenset({
+    '研究', '分析', '应用', '作用', '影响', '意义', '价值', '重要性', '特点', '优势', '劣势', '优点', '缺点', '好处', '坏处', '风险',
+    '机会', '前景', '未来', '现在', '过去', '历史', '现状', '情况', '状态', '水平', '程度', '范围', '领域', '行业', '市场', '经济',
+    '社会', '政治', '文化', '教育', '科技', '医疗', '健康', '环境', '能源', '交通', '通信', '金融', '投资', '管理', '运营', '生产',
+    '销售', '服务', '客户', '用户', '消费者', '企业', '公司', '组织', '机构', '政府', '部门', '单位', '团队', '个人', '专家', '学者',
+    '研究人员', '分析师', '顾问', '咨询师', '工程师', '设计师', '开发者', '程序员', '产品经理', '项目经理', '销售经理', '市场经理', '人力资源',
+    '财务', '会计', '法律', '律师', '医生', '护士', '教师', '学生', '家长', '孩子', '老人', '年轻人', '男性', '女性', '城市', '农村',
+    '地区', '国家', '国际', '全球', '世界', '中国', '美国', '欧洲', '亚洲', '非洲', '南美洲', '北美洲', '大洋洲', '北京', '上海',
+    '广州', '深圳', '杭州', '南京', '武汉', '成都', '西安', '重庆', '天津', '青岛', '大连', '厦门', '苏州', '无锡', '宁波', '温州',
+    '佛山', '东莞', '中山', '珠海', '江门', '肇庆', '惠州', '汕头', '湛江', '茂名', '韶关', '清远', '阳江', '河源', '梅州', '汕尾',
+    '潮州', '揭阳', '云浮', '广西', '海南', '云南', '贵州', '四川', '西藏', '新疆', '青海', '甘肃', '宁夏', '内蒙古', '黑龙江',
+    '吉林', '辽宁', '河北', '山西', '陕西', '河南', '山东', '江苏', '安徽', '浙江', '福建', '江西', '湖南', '湖北', '广东', '台湾',
+    '香港', '澳门',
+})
+
+# 仅在提取核心概念时额外过滤的泛化词
+_CONCEPT_EXTRA_STOP_WORDS = frozenset({
+    '区别', '差异', '对比', '用途',
+})
+
+# 仅在提取上下文关键词时额外过滤的文档描述类词汇
+_CONTEXT_EXTRA_STOP_WORDS = frozenset({
+    '相关', '文档', '相似度', '内容', '信息', '数据', '资料', '报告', '调查', '统计', '结果', '结论', '建议', '方法', '技术', '系统',
+    '发展', '趋势', '问题', '挑战', '机遇',
+})
+
+_QUESTION_STOP_WORDS = _FUNCTION_STOP_WORDS
+_CONCEPT_STOP_WORDS = _FUNCTION_STOP_WORDS | _TOPIC_STOP_WORDS | _CONCEPT_EXTRA_STOP_WORDS
+_CONTEXT_STOP_WORDS = _TOPIC_STOP_WORDS | _CONTEXT_EXTRA_STOP_WORDS
+
+# 法律专业术语词典（顺序即命中时的输出顺序）
+_LEGAL_TERMS = (
+    # 基础法律概念
+    "法律",
+    "法治",
+    "宪法",
+    "民法",
+    "刑法",
+    "行政法",
+    "商法",
+    "劳动法",
+    "知识产权法",
+    "环境法",
+    "国际法",
+
+    # 案件相关
+    "案件",
+    "诉讼",
+    "起诉",
+    "上诉",
+    "申诉",
+    "仲裁",
+    "调解",
+    "判决",
+    "裁定",
+    "执行",
+    "强制执行",
+
+    # 法律主体
+    "法院",
+    "检察院",
+    "公安机关",
+    "律师",
+    "法官",
+    "检察官",
+    "当事人",
+    "原告",
+    "被告",
+    "第三人",
+    "代理人",
+    "辩护人",
+
+    # 法律程序
+    "立案",
+    "审理",
+    "开庭",
+    "举证",
+    "质证",
+    "辩论",
+    "合议",
+    "宣判",
+    "送达",
+    "保全",
+    "先予执行",
+
+    # 法律责任
+    "民事责任",
+    "刑事责任",
+    "行政责任",
+    "违约责任",
+    "侵权责任",
+    "赔偿",
+    "补偿",
+    "罚款",
+    "拘留",
+    "有期徒刑",
+    "无期徒刑",
+    "死刑",
+
+    # 法律权利
+    "权利",
+    "义务",
+    "人身权",
+    "财产权",
+    "知识产权",
+    "继承权",
+    "监护权",
+    "抚养权",
+    "探视权",
+    "名誉权",
+    "隐私权",
+    "肖像权",
+
+    # 合同相关
+    "合同",
+    "协议",
+    "契约",
+    "要约",
+    "承诺",
+    "履行",
+    "违约",
+    "解除",
+    "终止",
+    "变更",
+    "转让",
+
+    # 婚姻家庭
+    "婚姻",
+    "结婚",
+    "离婚",
+    "夫妻",
+    "家庭",
+    "子女",
+    "父母",
+    "配偶",
+    "夫妻共同财产",
+    "婚前财产",
+    "婚后财产",
+
+    # 公司企业
+    "公司",
+    "企业",
+    "法人",
+    "股东",
+    "董事会",
+    "监事会",
+    "股东大会",
+    "公司章程",
+    "注册资本",
+    "股权",
+    "股份",
+    "上市",
+
+    # 金融法律
+    "银行",
+    "贷款",
+    "担保",
+    "抵押",
+    "质押",
+    "保证",
+    "保险",
+    "证券",
+    "基金",
+    "投资",
+    "融资",
+
+    # 劳动法律
+    "劳动合同",
+    "工资",
+    "加班",
+    "休假",
+    "社保",
+    "公积金",
+    "工伤",
+    "职业病",
+    "解雇",
+    "辞职",
+    "经济补偿",
+
+    # 房地产
+    "房地产",
+    "房屋",
+    "土地",
+    "产权",
+    "使用权",
+    "所有权",
+    "租赁",
+    "买卖",
+    "过户",
+    "登记",
+    "抵押贷款",
+
+    # 刑事法律
+    "犯罪",
+    "罪名",
+    "量刑",
+    "缓刑",
+    "假释",
+    "减刑",
+    "自首",
+    "立功",
+    "累犯",
+    "共犯",
+    "主犯",
+    "从犯",
+
+    # 行政法律
+    "行政处罚",
+    "行政许可",
+    "行政复议",
+    "行政诉讼",
+    "行政强制",
+    "行政监督",
+    "政府",
+    "行政机关",
+    "公务员",
+    "公职人员",
+)
+_LEGAL_TERM_ORDER = {term: i for i, term in enumerate(_LEGAL_TERMS)}
+
+# 问题类型及其提示词，按判定优先级排列（靠前的类型优先）
+_QUESTION_TYPE_WORDS = (
+    ("definition", ('是什么', '什么是', '定义', '含义', '概念')),
+    ("comparison", ('比较', '对比', '区别', '差异', '哪个更好', '哪个更')),
+    ("how_to", ('如何', '怎么', '怎样', '方法', '步骤', '怎么做')),
+    ("why", ('为什么', '原因', '为何', '导致')),
+    ("when", ('什么时候', '何时', '时间', '历史', '发展')),
+    ("where", ('哪里', '在哪', '地点', '位置', '地方')),
+    ("quantity", ('多少', '几个', '数量', '规模', '比例')),
+)
+
+
+def _sse(payload: Dict[str, Any]) -> str:
+    """把一帧数据编码为 SSE 消息（orjson 直接输出 UTF-8，等价于 ensure_ascii=False）"""
+    return "data:" + orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY).decode() + "\n\n"
 
 
 class TimeSeriesQA:
@@ -36,7 +377,7 @@ class TimeSeriesQA:
             'password': self.config.MYSQL_PASSWORD,
             'database': self.config.MYSQL_DATABASE,
             'charset': 'utf8mb4'
-        })
+        }, pool_size=self.config.MYSQL_POOL_SIZE)
 
 
         # 确保目录存在
@@ -55,6 +396,74 @@ class TimeSeriesQA:
         self.current_knowledge_base = self.config.KNOWLEDGE_BASE_PATH
         self.default_knowledge_base = self.config.KNOWLEDGE_BASE_PATH
 
+        # 会话消息缓存: session_id -> (变更标记, 格式化后的消息列表)
+        self._session_messages_cache: Dict[str, tuple] = {}
+
+        # 联网搜索结果缓存: 规范化查询 -> 搜索结果
+        self._web_cache = TTLCache(
+            maxsize=self.config.WEB_SEARCH_CACHE_SIZE,
+            ttl=self.config.WEB_SEARCH_CACHE_TTL
+        )
+        self._web_lock = threading.Lock()
+
+        # 回答准备结果缓存: (问题, 知识库路径) -> (相似文档, 分析报告, 模板, 联网搜索结果)
+        self._pipeline_cache = TTLCache(
+            maxsize=self.config.PIPELINE_CACHE_SIZE,
+            ttl=self.config.PIPELINE_CACHE_TTL
+        )
+        self._pipeline_lock = threading.Lock()
+
+        # 知识库分析结果缓存: 规范化路径 -> (目录指纹, 分析结果)
+        self._kb_stats_cache: Dict[str, tuple] = {}
+
+        # 复用 HTTP 连接（keep-alive），避免每次搜索都重新建立 TCP/TLS 连接
+        self._http = requests.Session()
+        self._http.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=1))
+        self._http.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=1))
+        self._http.headers.update({'User-Agent': _WEB_SEARCH_USER_AGENT})
+
+        # 检索缓存（以问题文本的 SHA1 为键）: 查询向量缓存 + (问题, top_k) -> 检索结果缓存
+        # 构建或切换知识库后清空
+        self._query_embedding_cache = LRUCache(maxsize=self.config.SEARCH_CACHE_SIZE)
+        self._search_results_cache = LRUCache(maxsize=self.config.SEARCH_RESULTS_CACHE_SIZE)
+        self._search_cache_lock = threading.Lock()
+        # 问题 -> 联网搜索查询（问题类型分析与核心概念提取均为纯字符串计算）
+        self._search_query_cache = LRUCache(maxsize=self.config.SEARCH_CACHE_SIZE)
+
+        # 模板缓存: ((模板路径, 修改时间), 模板内容)
+        self._template_cache: Optional[tuple] = None
+        # 流式回答系统提示缓存: (模板内容, 系统提示)，模板文件变化后随之重建
+        self._system_prefix_cache: Optional[tuple] = None
+
+        # 回答前准备工作（分析、模板、联网搜索）并行执行所用的线程池，每个请求提交 3 个任务；
+        # 按并发请求数放大，避免并发请求排队等待彼此的联网搜索（线程按需创建）
+        self._prep_executor = ThreadPoolExecutor(
+            max_workers=3 * self.config.MAX_CONCURRENT_REQUESTS, thread_name_prefix="qa-prep")
+        # 对话消息的后台写库线程池，写入不阻塞流式响应的最后一帧
+        self._db_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="qa-db")
+        # 会话ID -> 该会话最近一次后台写入的 Future；读取会话历史前先等待其完成
+        self._pending_writes: Dict[str, Future] = {}
+        self._pending_writes_lock = threading.Lock()
+
+        # 语义查询缓存：近期查询向量的内积索引，改写/近义的问题直接复用检索结果
+        self._semantic_cache_index = None  # 首次写入时按向量维度创建
+        self._semantic_cache_entries: List[tuple] = []  # 与索引行一一对应: (top_k, 检索结果)
+
+        # 回答缓存：精确层 (问题摘要, 知识库路径) -> 回答结果；语义层为问题向量的内积索引，
+        # 与 _answer_semantic_entries 按行对应 (知识库路径, 写入时间, 回答结果)
+        self._answer_cache = TTLCache(
+            maxsize=self.config.ANSWER_CACHE_SIZE,
+            ttl=self.config.ANSWER_CACHE_TTL
+        )
+        self._answer_semantic_index = None  # 首次写入时按向量维度创建
+        self._answer_semantic_entries: List[tuple] = []
+        self._answer_cache_lock = threading.Lock()
+
+        # 法律术语多模式匹配自动机（未安装 pyahocorasick 时为 None，回退到逐词匹配）
+        self._legal_terms_automaton = self._build_legal_terms_automaton()
+        # 问题类型提示词自动机（未安装 pyahocorasick 时为 None，回退到逐词匹配）
+        self._question_type_automaton = self._build_question_type_automaton()
+
 
     def _ensure_directories_exist(self):
         """确保必要的目录存在"""
@@ -72,7 +481,7 @@ class TimeSeriesQA:
             return client
         except ValueError as e:
             if "different settings" in str(e):
-                print("检测到 ChromaDB 设置冲突，正在清理并重新创建...")
+                logger.warning("检测到 ChromaDB 设置冲突，正在清理并重新创建...")
                 # 清理现有数据
                 if os.path.exists(self.config.CHROMA_DB_PATH):
                     shutil.rmtree(self.config.CHROMA_DB_PATH)
@@ -89,6 +498,13 @@ class TimeSeriesQA:
 
     def build_knowledge_base(self, data_path: str = None):
         """构建知识库（支持增量更新）"""
+        try:
+            return self._build_knowledge_base(data_path)
+        finally:
+            # 知识库内容可能已变化，缓存的检索结果不再可信
+            self._clear_search_caches()
+
+    def _build_knowledge_base(self, data_path: str = None):
         if data_path is None:
             data_path = self.config.KNOWLEDGE_BASE_PATH
 
@@ -102,33 +518,32 @@ class TimeSeriesQA:
         # 加载已有的文件哈希记录
         file_hashes = self._load_file_hashes()
 
-        # 扫描文件并识别变更
-        new_or_modified_files = []
+        # 扫描文件
         all_files = []
-
         for root, _, files in os.walk(data_path):
             for file in files:
                 if file.startswith('.'):  # 跳过隐藏文件
                     continue
+                all_files.append(os.path.join(root, file))
+        all_files.sort()
 
-                file_path = os.path.join(root, file)
-                all_files.append(file_path)
-
-                # 计算文件哈希
-                current_hash = self._calculate_file_hash(file_path)
+        # 并行计算文件哈希（I/O 密集，哈希计算期间会释放 GIL），大文件优先以缩短尾部等待
+        current_hashes = self._calculate_file_hashes(all_files)
 
-                # 检查文件是否新增或修改
-                if file_path not in file_hashes or file_hashes[file_path] != current_hash:
-                    new_or_modified_files.append(file_path)
-                    file_hashes[file_path] = current_hash
+        # 按路径顺序识别变更，保证后续分块顺序稳定
+        new_or_modified_files = []
+        for file_path in all_files:
+            current_hash = current_hashes[file_path]
+            if file_path not in file_hashes or file_hashes[file_path] != current_hash:
+                new_or_modified_files.append(file_path)
+                file_hashes[file_path] = current_hash
 
         # 删除不存在的文件记录
-        files_to_remove = [f for f in file_hashes.keys() if f not in all_files]
+        all_files_set = set(all_files)
+        files_to_remove = [f for f in file_hashes.keys() if f not in all_files_set]
         for file_path in files_to_remove:
             if file_path in file_hashes:
                 del file_hashes[file_path]
-            # 从知识库中删除对应文档
-            self._remove_documents_from_source(file_path)
 
         if not new_or_modified_files and not files_to_remove:
             print("没有检测到文件变更，跳过构建")
@@ -137,77 +552,38 @@ class TimeSeriesQA:
         print(f"检测到 {len(new_or_modified_files)} 个新增/修改文件，{len(files_to_remove)} 个删除文件")
 
         # 处理新增/修改的文件
-        documents = []
-        for file_path in new_or_modified_files:
-            try:
-                # 方式1：复用 DataProcessor 已有的细分加载方法（推荐，更高效）
-                file_ext = os.path.splitext(file_path)[1].lower()  # 获取文件后缀（如 .md, .txt）
-                if file_ext in ('.txt', '.md', '.rst', '.markdown'):
-                    # 文本类文件：调用 DataProcessor 的 _load_text_file 方法
-                    content = self.processor._load_text_file(file_path)
-                elif file_ext == '.csv':
-                    # CSV文件：调用 _load_csv_file 方法
-                    content = self.processor._load_csv_file(file_path)
-                elif file_ext in ('.xlsx', '.xls'):
-                    # Excel文件：调用 _load_excel_file 方法
-                    content = self.processor._load_excel_file(file_path)
-                elif file_ext == '.docx':  # 添加对Word文档的支持
-                    # Word文档：调用 _load_word_file 方法
-                    content = self.processor._load_word_file(file_path)
-                elif file.endswith('.doc'):
-                    content = self.processor._load_doc_file(file_path)
-                elif file_ext == '.pdf':
-                    content = self.processor._load_pdf_file(file_path)
-                else:
-                    print(f"跳过不支持的文件格式: {file_path}")
-                    continue
+        contents, sources, _ = self._load_documents(new_or_modified_files)
 
-                # 将加载的内容添加到文档列表
-                documents.append({
-                    "content": content,
-                    "source": file_path,
-                    "type": file_ext  # 记录文件类型
-                })
-                print(f"加载文件: {file_path}")
-
-            except Exception as e:
-                print(f"加载文件 {file_path} 时出错: {str(e)}")
-
-        if not documents and not files_to_remove:
+        if not contents and not files_to_remove:
             print("没有需要处理的文档")
             return 0
 
-        # 处理文档分块和嵌入
-        chunks = self.processor.chunk_documents(documents)
-        print(f"文档分块完成，共 {len(chunks)} 个块")
-
-        # 生成嵌入向量
-        chunk_texts = [chunk["content"] for chunk in chunks]
-        embeddings = self.processor.generate_embeddings(chunk_texts)
-        print("嵌入向量生成完成")
+        # 处理文档分块和嵌入（按列组织：块文本、来源、块序号三个等长列表）
+        documents_content, chunk_sources, chunk_indexes = self.processor.chunk_documents_soa(contents, sources)
 
         # 准备数据用于存储
-        ids = [f"doc_{hash(chunk['source'] + str(chunk['chunk_index'])):x}" for chunk in chunks]
-        documents_content = [chunk["content"] for chunk in chunks]
+        # 基于来源和块序号的确定性 ID，跨进程稳定，重复写入时可直接覆盖
+        # 每个来源只编码一次；xxh3_64 的整数摘要按 16 位十六进制格式化，与 hexdigest 结果一致
+        source_prefix = {source: source.encode('utf-8') + b'|' for source in sources}
+        ids = [f"doc_{xxhash.xxh3_64_intdigest(source_prefix[source] + str(index).encode()):016x}"
+               for source, index in zip(chunk_sources, chunk_indexes)]
+        # 每个来源只计算一次后缀和哈希，块级循环内只做字典查找
+        ext_by_src = {source: os.path.splitext(source)[1] for source in sources}
+        hash_by_src = {source: file_hashes.get(source, "unknown") for source in sources}
         metadatas = [{
-            "source": chunk["source"],
-            "chunk_index": chunk["chunk_index"],
-            "document_type": os.path.splitext(chunk["source"])[1] if "source" in chunk else "unknown",
-            "file_hash": file_hashes.get(chunk["source"], "unknown")
-        } for chunk in chunks]
+            "source": source,
+            "chunk_index": index,
+            "document_type": ext_by_src[source],
+            "file_hash": hash_by_src[source]
+        } for source, index in zip(chunk_sources, chunk_indexes)]
 
-        # 先删除已修改文件的旧文档
-        for file_path in new_or_modified_files:
-            self._remove_documents_from_source(file_path)
+        # 一次性删除已修改文件的旧文档和已删除文件对应的文档
+        self._remove_documents_from_sources(set(new_or_modified_files) | set(files_to_remove))
 
-        # 添加新文档到集合
+        # 生成嵌入向量并添加新文档到集合（嵌入与写入流水线并行）
         try:
-            self.collection.add(
-                ids=ids,
-                embeddings=embeddings.tolist(),
-                documents=documents_content,
-                metadatas=metadatas
-            )
+            self._embed_and_add(ids, documents_content, metadatas)
+            print("嵌入向量生成完成")
 
             # 保存文件哈希记录
             self._save_file_hashes(file_hashes)
@@ -215,36 +591,165 @@ class TimeSeriesQA:
             count = self.collection.count()
             print(f"知识库更新完成，当前文档总数: {count}")
 
-            return len(chunks)
+            return len(ids)
 
         except Exception as e:
             print(f"更新知识库时出错: {e}")
             return 0
 
+    def _load_documents(self, file_paths):
+        """按后缀分派加载文件；文件较多时在进程池中并行解析。返回 (内容列表, 来源列表, 类型列表)"""
+        worklist = []
+        for file_path in file_paths:
+            file_ext = os.path.splitext(file_path)[1].lower()  # 获取文件后缀（如 .md, .txt）
+            loader_name = _FILE_LOADERS.get(file_ext)
+            if loader_name is None:
+                print(f"跳过不支持的文件格式: {file_path}")
+                continue
+            worklist.append((file_path, file_ext, loader_name))
+
+        contents = {}
+        max_workers = min(self.config.FILE_LOAD_WORKERS, len(worklist))
+        if max_workers > 1:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                futures = {
+                    executor.submit(load_file_in_worker, (file_path, self.processor.model_name, loader_name)): file_path
+                    for file_path, _, loader_name in worklist
+                }
+                for future in as_completed(futures):
+                    file_path = futures[future]
+                    try:
+                        contents[file_path] = future.result()
+                    except Exception as e:
+                        print(f"加载文件 {file_path} 时出错: {str(e)}")
+        else:
+            for file_path, _, loader_name in worklist:
+                try:
+                    contents[file_path] = getattr(self.processor, loader_name)(file_path)
+                except Exception as e:
+                    print(f"加载文件 {file_path} 时出错: {str(e)}")
+
+        # 按原始顺序组装文档（按列存放），保证分块顺序稳定
+        contents_list, sources, types = [], [], []
+        for file_path, file_ext, _ in worklist:
+            if file_path not in contents:
+                continue
+            contents_list.append(contents[file_path])
+            sources.append(file_path)
+            types.append(file_ext)  # 记录文件类型
+            print(f"加载文件: {file_path}")
+        return contents_list, sources, types
+
+    def _embed_and_add(self, ids, documents_content, metadatas):
+        """分批生成嵌入并写入集合：后台线程计算下一批嵌入的同时，主线程写入当前批"""
+        pipeline_batch_size = self.config.EMBEDDING_PIPELINE_BATCH_SIZE
+        add_batch_size = self.config.CHROMA_ADD_BATCH_SIZE
+        batches = Queue(maxsize=2)
+        error = [None]
+        # 写入失败时由主线程置位，生产线程不再计算剩余批次的嵌入
+        stop = threading.Event()
+
+        def put(item):
+            """放入队列；队列已满时定期检查停止标志，主线程停止消费后不会永久阻塞"""
+            while not stop.is_set():
+                try:
+                    batches.put(item, timeout=0.5)
+                    return True
+                except Full:
+                    continue
+            return False
+
+        def produce():
+            try:
+                for start in range(0, len(ids), pipeline_batch_size):
+                    if stop.is_set():
+                        return
+                    end = start + pipeline_batch_size
+                    embeddings = self.processor.generate_embeddings(documents_content[start:end])
+                    if not put((start, end, embeddings)):
+                        return
+            except Exception as e:
+                error[0] = e
+            finally:
+                put(None)
+
+        producer = threading.Thread(target=produce, name="embedding-producer", daemon=True)
+        producer.start()
+        try:
+            while True:
+                batch = batches.get()
+                if batch is None:
+                    break
+                start, end, embeddings = batch
+                for offset in range(0, end - start, add_batch_size):
+                    lo, hi = start + offset, min(start + offset + add_batch_size, end)
+                    self.collection.upsert(
+                        ids=ids[lo:hi],
+                        embeddings=embeddings[offset:offset + add_batch_size],  # 直接传 numpy 视图，避免逐元素转成 Python float
+                        documents=documents_content[lo:hi],
+                        metadatas=metadatas[lo:hi]
+                    )
+        except Exception:
+            # 写入失败时通知生产线程停止，避免其继续计算嵌入并阻塞在 put 上
+            stop.set()
+            raise
+        finally:
+            producer.join()
+
+        if error[0] is not None:
+            raise error[0]
+
     def _load_file_hashes(self):
         """加载文件哈希记录"""
         if os.path.exists(self.config.FILE_HASH_DB):
             try:
-                with open(self.config.FILE_HASH_DB, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                with open(self.config.FILE_HASH_DB, 'rb') as f:
+                    file_hashes = orjson.loads(f.read())
             except:
                 return {}
+            version = file_hashes.pop(_FILE_HASH_VERSION_KEY, None)
+            if version != _FILE_HASH_VERSION:
+                # 哈希算法已变更：保留路径以便识别删除的文件，但让所有文件重新比对
+                return {file_path: None for file_path in file_hashes}
+            return file_hashes
         return {}
 
     def _save_file_hashes(self, file_hashes):
         """保存文件哈希记录"""
         os.makedirs(os.path.dirname(self.config.FILE_HASH_DB), exist_ok=True)
-        with open(self.config.FILE_HASH_DB, 'w', encoding='utf-8') as f:
-            json.dump(file_hashes, f, ensure_ascii=False, indent=2)
+        with open(self.config.FILE_HASH_DB, 'wb') as f:
+            f.write(orjson.dumps({_FILE_HASH_VERSION_KEY: _FILE_HASH_VERSION, **file_hashes}))
+
+    def _calculate_file_hashes(self, file_paths):
+        """并行计算多个文件的哈希值，返回 {文件路径: 哈希值}"""
+        def file_size(path):
+            try:
+                return os.path.getsize(path)
+            except OSError:
+                return 0
+
+        ordered = sorted(file_paths, key=file_size, reverse=True)
+        max_workers = min(32, (os.cpu_count() or 1) * 4)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return dict(zip(ordered, executor.map(self._calculate_file_hash, ordered)))
 
     def _calculate_file_hash(self, file_path):
-        """计算文件哈希值"""
-        import hashlib
-        hasher = hashlib.md5()
+        """计算文件哈希值（xxh3，通过 mmap 零拷贝读取，仅用于变更检测）"""
+        hasher = xxhash.xxh3_64()
         try:
             with open(file_path, 'rb') as f:
-                buf = f.read()
-                hasher.update(buf)
+                size = os.fstat(f.fileno()).st_size
+                if size:  # 空文件无法 mmap
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        if size <= _HASH_WHOLE_FILE_LIMIT:
+                            hasher.update(mm)
+                        else:
+                            view = memoryview(mm)
+                            try:
+                                for offset in range(0, size, _HASH_BLOCK_SIZE):
+                                    hasher.update(view[offset:offset + _HASH_BLOCK_SIZE])
+                            finally:
+                                view.release()
             return hasher.hexdigest()
         except:
             return "error"
@@ -252,17 +757,21 @@ class TimeSeriesQA:
     def _remove_documents_from_source(self, source_path):
         """删除指定来源的所有文档"""
         try:
-            # 查询所有来自该来源的文档
-            results = self.collection.get(
-                where={"source": source_path}
-                # 不需要指定 include=["ids"]，因为 ids 是默认返回的
-                # 可以添加其他需要的字段，如 include=["metadatas"]
-            )
+            # 直接按元数据过滤删除，无需先查询出全部 ID
+            self.collection.delete(where={"source": source_path})
+            print(f"已删除来自 {source_path} 的文档")
 
-            if results['ids']:
-                self.collection.delete(ids=results['ids'])
-                print(f"已删除 {len(results['ids'])} 个来自 {source_path} 的文档")
+        except Exception as e:
+            print(f"删除文档时出错: {e}")
 
+    def _remove_documents_from_sources(self, source_paths):
+        """一次性删除多个来源的所有文档"""
+        source_paths = list(source_paths)
+        if not source_paths:
+            return
+        try:
+            self.collection.delete(where={"source": {"$in": source_paths}})
+            print(f"已删除来自 {len(source_paths)} 个文件的旧文档")
         except Exception as e:
             print(f"删除文档时出错: {e}")
 
@@ -271,8 +780,22 @@ class TimeSeriesQA:
         if top_k is None:
             top_k = self.config.TOP_K
 
-        # 生成查询嵌入
-        query_embedding = self.processor.generate_embeddings([query])[0].tolist()
+        query_key = hashlib.sha1(query.strip().encode('utf-8')).hexdigest()
+        results_key = (query_key, top_k)
+        with self._search_cache_lock:
+            cached = self._search_results_cache.get(results_key)
+            if cached is not None:
+                return list(cached)
+
+        query_embedding = self._get_query_embedding(query, query_key)
+
+        # 语义缓存（与回答缓存的语义层一样需 ANSWER_CACHE_SEMANTIC 开启）：与近期某个查询足够相似时直接返回其结果
+        normalized_query = None
+        if self.config.ANSWER_CACHE_SEMANTIC:
+            normalized_query = self._normalized_query(query_embedding)
+            cached = self._probe_semantic_cache(normalized_query, top_k)
+            if cached is not None:
+                return list(cached)
 
         # 搜索相似文档
         results = self.collection.query(
@@ -282,100 +805,203 @@ class TimeSeriesQA:
 
         similar_docs = []
         if results['documents'] and results['documents'][0]:
+            # 内容完全相同的块（如重复上传的文件）只保留相似度最高的一个，避免重复内容占用上下文
+            seen_contents = set()
             for i in range(len(results['documents'][0])):
                 similarity = 1 - results['distances'][0][i]  # 转换距离为相似度
                 print("similarity=", similarity)
+                content = results['documents'][0][i]
+                if content in seen_contents:
+                    continue
+                seen_contents.add(content)
                 if similarity >= self.config.SIMILARITY_THRESHOLD:
                     similar_docs.append({
-                        "content": results['documents'][0][i],
+                        "content": content,
                         "similarity": similarity,
                         "metadata": results['metadatas'][0][i] if results['metadatas'] and results['metadatas'][
                             0] else {}
                     })
 
-        return similar_docs
+        with self._search_cache_lock:
+            self._search_results_cache[results_key] = similar_docs
+        if normalized_query is not None:
+            self._add_to_semantic_cache(normalized_query, top_k, similar_docs)
+        return list(similar_docs)
+
+    def _get_query_embedding(self, query: str, query_key: str = None) -> List[float]:
+        """生成查询嵌入（相同查询复用已有向量，省去一次模型前向计算）"""
+        if query_key is None:
+            query_key = hashlib.sha1(query.strip().encode('utf-8')).hexdigest()
+        with self._search_cache_lock:
+            query_embedding = self._query_embedding_cache.get(query_key)
+        if query_embedding is None:
+            query_embedding = self.processor.generate_embeddings([query])[0].tolist()
+            with self._search_cache_lock:
+                self._query_embedding_cache[query_key] = query_embedding
+        return query_embedding
+
+    @staticmethod
+    def _normalized_query(query_embedding: List[float]) -> np.ndarray:
+        """把查询向量转换为 L2 归一化的 (1, d) float32 数组，内积即余弦相似度"""
+        normalized_query = np.array([query_embedding], dtype='float32')
+        faiss.normalize_L2(normalized_query)
+        return normalized_query
+
+    def _probe_semantic_cache(self, normalized_query, top_k):
+        """在语义缓存中查找最相近的历史查询，相似度达到阈值且 top_k 相同时返回其结果"""
+        with self._search_cache_lock:
+            index = self._semantic_cache_index
+            if index is None or index.ntotal == 0:
+                return None
+            similarities, positions = index.search(normalized_query, 1)
+            position = int(positions[0][0])
+            if position < 0 or similarities[0][0] < self.config.SEMANTIC_CACHE_THRESHOLD:
+                return None
+            cached_top_k, results = self._semantic_cache_entries[position]
+            return results if cached_top_k == top_k else None
+
+    def _add_to_semantic_cache(self, normalized_query, top_k, results):
+        """写入语义缓存，超过容量时淘汰最早的条目（FIFO）"""
+        with self._search_cache_lock:
+            if self._semantic_cache_index is None:
+                self._semantic_cache_index = faiss.IndexFlatIP(normalized_query.shape[1])
+            if self._semantic_cache_index.ntotal >= self.config.SEMANTIC_CACHE_SIZE:
+                self._semantic_cache_index.remove_ids(np.array([0], dtype='int64'))
+                self._semantic_cache_entries.pop(0)
+            self._semantic_cache_index.add(normalized_query)
+            self._semantic_cache_entries.append((top_k, results))
+
+    def _clear_search_caches(self):
+        """清空查询向量、检索结果、回答准备结果与回答缓存"""
+        with self._search_cache_lock:
+            self._query_embedding_cache.clear()
+            self._search_results_cache.clear()
+            if self._semantic_cache_index is not None:
+                self._semantic_cache_index.reset()
+            self._semantic_cache_entries.clear()
+        with self._pipeline_lock:
+            self._pipeline_cache.clear()
+        with self._answer_cache_lock:
+            self._answer_cache.clear()
+            if self._answer_semantic_index is not None:
+                self._answer_semantic_index.reset()
+            self._answer_semantic_entries.clear()
 
     def _bing_search(self, query: str) -> List[Dict[str, str]]:
-        """使用必应国内版进行搜索并解析前若干结果（无额外第三方依赖）。"""
+        """使用必应国内版进行搜索并解析前若干结果（优先使用 selectolax 解析，未安装时回退到正则）。"""
         if not getattr(self.config, 'WEB_SEARCH_ENABLED', True):
             return []
+        cache_key = query.strip().lower()
+        with self._web_lock:
+            cached = self._web_cache.get(cache_key)
+        if cached is not None:
+            print(f"命中搜索缓存: {query}")
+            return list(cached)
+        config = self.config
+        topn = getattr(config, 'WEB_SEARCH_TOPN', 3)
+        mkt = getattr(config, 'WEB_SEARCH_MKT', 'zh-CN')
+        url = getattr(config, 'WEB_SEARCH_ENGINE_URL', 'https://cn.bing.com/search')
+        timeout = getattr(config, 'WEB_SEARCH_TIMEOUT', 8)
         try:
             params = {
                 'q': query,
-                'mkt': getattr(self.config, 'WEB_SEARCH_MKT', 'zh-CN')
-            }
-            url = getattr(self.config, 'WEB_SEARCH_ENGINE_URL', 'https://cn.bing.com/search')
-            timeout = getattr(self.config, 'WEB_SEARCH_TIMEOUT', 8)
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0 Safari/537.36'
+                'mkt': mkt
             }
-            resp = requests.get(url, params=params, timeout=timeout, headers=headers)
+            resp = self._http.get(url, params=params, timeout=timeout)
             text = resp.text
-            results = []
-            
+
             print(f"正在搜索: {query}")  # 添加调试信息
-            
-            # 模式1：查找h2标签中的链接
-            for m in re.finditer(r'<h2[^>]*>.*?<a[^>]*href="([^"]*)"[^>]*>([^<]+)</a>.*?</h2>', text, re.DOTALL):
-                link = html.unescape(m.group(1).strip())
-                title = html.unescape(m.group(2).strip())
-                
-                # 过滤掉必应内部链接和无效链接
-                if (link.startswith('http') and 
-                    'bing.com' not in link and 
-                    title and 
-                    len(title) > 3):
-                    results.append({'title': title, 'snippet': '', 'link': link})
-                    if len(results) >= getattr(self.config, 'WEB_SEARCH_TOPN', 3):
-                        break
-            
-            # 模式1.5：查找更复杂的h2结构
-            if not results:
-                for m in re.finditer(r'<h2[^>]*>.*?<a[^>]*href="([^"]*)"[^>]*>([^<]+)</a>.*?</h2>', text, re.DOTALL):
-                    link = html.unescape(m.group(1).strip())
-                    title = html.unescape(m.group(2).strip())
-                    
-                    # 过滤掉必应内部链接和无效链接
-                    if (link.startswith('http') and 
-                        'bing.com' not in link and 
-                        title and 
-                        len(title) > 3):
-                        results.append({'title': title, 'snippet': '', 'link': link})
-                        if len(results) >= getattr(self.config, 'WEB_SEARCH_TOPN', 3):
-                            break
-            
-            # 如果新模式没有结果，尝试原来的模式
-            if not results:
-                # 解析常见结果块：<li class="b_algo"> ...
-                for m in re.finditer(r'<li class=\"b_algo\"[\s\S]*?<h2>[\s\S]*?<a href=\"(.*?)\"[^>]*>([\s\S]*?)</a>[\s\S]*?</h2>[\s\S]*?(?:<p[^>]*>([\s\S]*?)</p>)?', text):
-                    link = html.unescape(re.sub(r'\s+', ' ', m.group(1) or '').strip())
-                    title_raw = re.sub(r'<.*?>', '', m.group(2) or '')
-                    title = html.unescape(re.sub(r'\s+', ' ', title_raw).strip())
-                    snippet_raw = re.sub(r'<.*?>', '', m.group(3) or '')
-                    snippet = html.unescape(re.sub(r'\s+', ' ', snippet_raw).strip())
-                    if link and title:
-                        results.append({'title': title, 'snippet': snippet, 'link': link})
-                    if len(results) >= getattr(self.config, 'WEB_SEARCH_TOPN', 3):
-                        break
-                        
-            # 回退：若未匹配到b_algo，尝试通用a标签解析
+
+            # 优先使用 HTML 解析器按结果块提取
+            results = self._parse_bing_results(text, topn)
+
+            # 回退：正则单次扫描解析
             if not results:
-                for m in re.finditer(r'<a href=\"(https?://[^\"]+)\"[^>]*>([\s\S]*?)</a>', text):
-                    link = html.unescape(m.group(1))
-                    title = html.unescape(re.sub(r'<.*?>', '', m.group(2) or '').strip())
-                    if 'bing.com' in link:
-                        continue
-                    if title:
-                        results.append({'title': title, 'snippet': '', 'link': link})
-                    if len(results) >= getattr(self.config, 'WEB_SEARCH_TOPN', 3):
-                        break
-            
+                results = self._regex_parse_bing_results(text, topn)
+
             print(f"搜索完成，获得 {len(results)} 个结果")  # 添加调试信息
+            if results:  # 空结果可能是临时失败，不缓存
+                with self._web_lock:
+                    self._web_cache[cache_key] = list(results)
             return results
         except Exception as e:
             print(f"搜索异常: {e}")  # 添加调试信息
             return []
 
+    def _parse_bing_results(self, text: str, topn: int) -> List[Dict[str, str]]:
+        """用 selectolax 解析必应结果块；未安装 selectolax 或解析失败时返回空列表，由正则模式兜底。"""
+        try:
+            from selectolax.parser import HTMLParser
+        except ImportError:
+            return []
+
+        results = []
+        try:
+            tree = HTMLParser(text)
+            for node in tree.css('li.b_algo'):
+                a = node.css_first('h2 a')
+                if a is None:
+                    continue
+                link = (a.attributes.get('href') or '').strip()
+                title = _WHITESPACE_RE.sub(' ', a.text()).strip()
+                if not link.startswith('http') or 'bing.com' in link or not title:
+                    continue
+                p = node.css_first('p')
+                snippet = _WHITESPACE_RE.sub(' ', p.text()).strip() if p is not None else ''
+                results.append({'title': title, 'snippet': snippet, 'link': link})
+                if len(results) >= topn:
+                    break
+        except Exception as e:
+            print(f"解析搜索结果失败: {e}")
+            return []
+        return results
+
+    @staticmethod
+    def _regex_parse_bing_results(text: str, topn: int) -> List[Dict[str, str]]:
+        """用正则逐级解析结果页：h2 标题优先，其次 b_algo 结果块，最后通用 a 标签。"""
+        # 模式1：查找h2标签中的链接
+        results = []
+        for m in _BING_H2_RE.finditer(text):
+            link = html.unescape(m.group(1).strip())
+            title = html.unescape(m.group(2).strip())
+
+            # 过滤掉必应内部链接（含 bing.com/ck 跳转链接）和无效链接
+            if (link.startswith('http') and
+                'bing.com' not in link and
+                title and
+                len(title) > 3):
+                results.append({'title': title, 'snippet': '', 'link': link})
+                if len(results) >= topn:
+                    return results
+        if results:
+            return results
+
+        # 模式2：解析常见结果块：<li class="b_algo"> ...
+        for m in _BING_ALGO_RE.finditer(text):
+            link = html.unescape(_WHITESPACE_RE.sub(' ', m.group(1) or '').strip())
+            title_raw = _HTML_TAG_RE.sub('', m.group(2) or '')
+            title = html.unescape(_WHITESPACE_RE.sub(' ', title_raw).strip())
+            snippet_raw = _HTML_TAG_RE.sub('', m.group(3) or '')
+            snippet = html.unescape(_WHITESPACE_RE.sub(' ', snippet_raw).strip())
+            if link and title:
+                results.append({'title': title, 'snippet': snippet, 'link': link})
+            if len(results) >= topn:
+                return results
+        if results:
+            return results
+
+        # 回退：若未匹配到b_algo，尝试通用a标签解析
+        for m in _BING_A_RE.finditer(text):
+            link = html.unescape(m.group(1))
+            title = html.unescape(_HTML_TAG_RE.sub('', m.group(2) or '').strip())
+            if 'bing.com' in link:
+                continue
+            if title:
+                results.append({'title': title, 'snippet': '', 'link': link})
+            if len(results) >= topn:
+                break
+        return results
+
     def _summarize_web_results(self, results: List[Dict[str, str]]) -> str:
         """将搜索结果压缩为简短中文摘要，并列出可引用的关键信息。"""
         if not results:
@@ -392,10 +1018,21 @@ class TimeSeriesQA:
         return summary
 
     def _build_search_query(self, question: str, context_text: str, template_text: str) -> str:
-        """构建更精准的搜索查询"""
+        """构建更精准的搜索查询（查询只由问题决定，按问题缓存推导结果）"""
         # 1. 基础问题处理
         base_query = question.strip()
-        
+        with self._search_cache_lock:
+            cached = self._search_query_cache.get(base_query)
+        if cached is not None:
+            return cached
+
+        search_query = self._derive_search_query(base_query)
+        with self._search_cache_lock:
+            self._search_query_cache[base_query] = search_query
+        return search_query
+
+    def _derive_search_query(self, base_query: str) -> str:
+        """由问题推导联网搜索查询：问题类型分析 + 核心概念提取"""
         # 2. 分析问题类型
         question_type = self._analyze_question_type(base_query)
         
@@ -438,214 +1075,20 @@ class TimeSeriesQA:
         # 1. 移除问句标记和停用词
         cleaned_question = question.replace("？", "").replace("?", "")
         
-        # 2. 定义法律专业术语词典
-        legal_terms = {
-            # 基础法律概念
-            "法律": "法律",
-            "法治": "法治",
-            "宪法": "宪法",
-            "民法": "民法",
-            "刑法": "刑法",
-            "行政法": "行政法",
-            "商法": "商法",
-            "劳动法": "劳动法",
-            "知识产权法": "知识产权法",
-            "环境法": "环境法",
-            "国际法": "国际法",
-            
-            # 案件相关
-            "案件": "案件",
-            "诉讼": "诉讼",
-            "起诉": "起诉",
-            "上诉": "上诉",
-            "申诉": "申诉",
-            "仲裁": "仲裁",
-            "调解": "调解",
-            "判决": "判决",
-            "裁定": "裁定",
-            "执行": "执行",
-            "强制执行": "强制执行",
-            
-            # 法律主体
-            "法院": "法院",
-            "检察院": "检察院",
-            "公安机关": "公安机关",
-            "律师": "律师",
-            "法官": "法官",
-            "检察官": "检察官",
-            "当事人": "当事人",
-            "原告": "原告",
-            "被告": "被告",
-            "第三人": "第三人",
-            "代理人": "代理人",
-            "辩护人": "辩护人",
-            
-            # 法律程序
-            "立案": "立案",
-            "审理": "审理",
-            "开庭": "开庭",
-            "举证": "举证",
-            "质证": "质证",
-            "辩论": "辩论",
-            "合议": "合议",
-            "宣判": "宣判",
-            "送达": "送达",
-            "保全": "保全",
-            "先予执行": "先予执行",
-            
-            # 法律责任
-            "民事责任": "民事责任",
-            "刑事责任": "刑事责任",
-            "行政责任": "行政责任",
-            "违约责任": "违约责任",
-            "侵权责任": "侵权责任",
-            "赔偿": "赔偿",
-            "补偿": "补偿",
-            "罚款": "罚款",
-            "拘留": "拘留",
-            "有期徒刑": "有期徒刑",
-            "无期徒刑": "无期徒刑",
-            "死刑": "死刑",
-            
-            # 法律权利
-            "权利": "权利",
-            "义务": "义务",
-            "人身权": "人身权",
-            "财产权": "财产权",
-            "知识产权": "知识产权",
-            "继承权": "继承权",
-            "监护权": "监护权",
-            "抚养权": "抚养权",
-            "探视权": "探视权",
-            "名誉权": "名誉权",
-            "隐私权": "隐私权",
-            "肖像权": "肖像权",
-            
-            # 合同相关
-            "合同": "合同",
-            "协议": "协议",
-            "契约": "契约",
-            "要约": "要约",
-            "承诺": "承诺",
-            "履行": "履行",
-            "违约": "违约",
-            "解除": "解除",
-            "终止": "终止",
-            "变更": "变更",
-            "转让": "转让",
-            
-            # 婚姻家庭
-            "婚姻": "婚姻",
-            "结婚": "结婚",
-            "离婚": "离婚",
-            "夫妻": "夫妻",
-            "家庭": "家庭",
-            "子女": "子女",
-            "父母": "父母",
-            "配偶": "配偶",
-            "夫妻共同财产": "夫妻共同财产",
-            "婚前财产": "婚前财产",
-            "婚后财产": "婚后财产",
-            
-            # 公司企业
-            "公司": "公司",
-            "企业": "企业",
-            "法人": "法人",
-            "股东": "股东",
-            "董事会": "董事会",
-            "监事会": "监事会",
-            "股东大会": "股东大会",
-            "公司章程": "公司章程",
-            "注册资本": "注册资本",
-            "股权": "股权",
-            "股份": "股份",
-            "上市": "上市",
-            
-            # 金融法律
-            "银行": "银行",
-            "贷款": "贷款",
-            "担保": "担保",
-            "抵押": "抵押",
-            "质押": "质押",
-            "保证": "保证",
-            "保险": "保险",
-            "证券": "证券",
-            "基金": "基金",
-            "投资": "投资",
-            "融资": "融资",
-            
-            # 劳动法律
-            "劳动合同": "劳动合同",
-            "工资": "工资",
-            "加班": "加班",
-            "休假": "休假",
-            "社保": "社保",
-            "公积金": "公积金",
-            "工伤": "工伤",
-            "职业病": "职业病",
-            "解雇": "解雇",
-            "辞职": "辞职",
-            "经济补偿": "经济补偿",
-            
-            # 房地产
-            "房地产": "房地产",
-            "房屋": "房屋",
-            "土地": "土地",
-            "产权": "产权",
-            "使用权": "使用权",
-            "所有权": "所有权",
-            "租赁": "租赁",
-            "买卖": "买卖",
-            "过户": "过户",
-            "登记": "登记",
-            "抵押贷款": "抵押贷款",
-            
-            # 刑事法律
-            "犯罪": "犯罪",
-            "罪名": "罪名",
-            "量刑": "量刑",
-            "缓刑": "缓刑",
-            "假释": "假释",
-            "减刑": "减刑",
-            "自首": "自首",
-            "立功": "立功",
-            "累犯": "累犯",
-            "共犯": "共犯",
-            "主犯": "主犯",
-            "从犯": "从犯",
-            
-            # 行政法律
-            "行政处罚": "行政处罚",
-            "行政许可": "行政许可",
-            "行政复议": "行政复议",
-            "行政诉讼": "行政诉讼",
-            "行政强制": "行政强制",
-            "行政监督": "行政监督",
-            "政府": "政府",
-            "行政机关": "行政机关",
-            "公务员": "公务员",
-            "公职人员": "公职人员"
-        }
-        
-        # 3. 查找专业术语
-        for term, standard_term in legal_terms.items():
-            if term in cleaned_question:
-                concepts.append(standard_term)
+        # 2. 查找专业术语
+        concepts.extend(self._match_legal_terms(cleaned_question))
         
-        # 4. 如果没有找到专业术语，提取关键词
+        # 3. 如果没有找到专业术语，提取关键词
         if not concepts:
             # 提取2-6字的中文词汇
-            import re
-            words = re.findall(r'[\u4e00-\u9fff]{2,6}', cleaned_question)
+            words = _CJK_2_6_RE.findall(cleaned_question)
             
             # 过滤停用词
-            stop_words = {'什么', '如何', '怎么', '为什么', '哪个', '哪些', '是', '的', '了', '在', '有', '和', '与', '或', '但', '然而', '因此', '所以', '因为', '如果', '当', '就', '都', '很', '非常', '比较', '更', '最', '还', '也', '又', '再', '已经', '正在', '将要', '可以', '能够', '应该', '必须', '需要', '要求', '希望', '想要', '喜欢', '不喜欢', '认为', '觉得', '知道', '了解', '明白', '理解', '学习', '研究', '分析', '讨论', '介绍', '说明', '解释', '描述', '总结', '概括', '区别', '差异', '比较', '对比', '应用', '用途', '作用', '影响', '意义', '价值', '重要性', '特点', '优势', '劣势', '优点', '缺点', '好处', '坏处', '风险', '机会', '前景', '未来', '现在', '过去', '历史', '现状', '情况', '状态', '水平', '程度', '范围', '领域', '行业', '市场', '经济', '社会', '政治', '文化', '教育', '科技', '医疗', '健康', '环境', '能源', '交通', '通信', '金融', '投资', '管理', '运营', '生产', '销售', '服务', '客户', '用户', '消费者', '企业', '公司', '组织', '机构', '政府', '部门', '单位', '团队', '个人', '专家', '学者', '研究人员', '分析师', '顾问', '咨询师', '工程师', '设计师', '开发者', '程序员', '产品经理', '项目经理', '销售经理', '市场经理', '人力资源', '财务', '会计', '法律', '律师', '医生', '护士', '教师', '学生', '家长', '孩子', '老人', '年轻人', '男性', '女性', '城市', '农村', '地区', '国家', '国际', '全球', '世界', '中国', '美国', '欧洲', '亚洲', '非洲', '南美洲', '北美洲', '大洋洲', '北京', '上海', '广州', '深圳', '杭州', '南京', '武汉', '成都', '西安', '重庆', '天津', '青岛', '大连', '厦门', '苏州', '无锡', '宁波', '温州', '佛山', '东莞', '中山', '珠海', '江门', '肇庆', '惠州', '汕头', '湛江', '茂名', '韶关', '清远', '阳江', '河源', '梅州', '汕尾', '潮州', '揭阳', '云浮', '广西', '海南', '云南', '贵州', '四川', '重庆', '西藏', '新疆', '青海', '甘肃', '宁夏', '内蒙古', '黑龙江', '吉林', '辽宁', '河北', '山西', '陕西', '河南', '山东', '江苏', '安徽', '浙江', '福建', '江西', '湖南', '湖北', '广东', '台湾', '香港', '澳门'}
-            
             for word in words:
-                if word not in stop_words and len(word) >= 2:
+                if word not in _CONCEPT_STOP_WORDS and len(word) >= 2:
                     concepts.append(word)
         
-        # 5. 去重并按长度排序
+        # 4. 去重并按长度排序
         unique_concepts = []
         seen = set()
         for concept in concepts:
@@ -658,6 +1101,26 @@ class TimeSeriesQA:
         
         return unique_concepts[:3]  # 最多返回3个核心概念
     
+    @staticmethod
+    def _build_legal_terms_automaton():
+        """构建法律术语的 Aho-Corasick 自动机，一次线性扫描即可匹配全部术语"""
+        try:
+            import ahocorasick
+        except ImportError:
+            return None
+        automaton = ahocorasick.Automaton()
+        for term in _LEGAL_TERMS:
+            automaton.add_word(term, term)
+        automaton.make_automaton()
+        return automaton
+
+    def _match_legal_terms(self, text: str) -> List[str]:
+        """返回文本中出现的法律术语，按词典顺序排列"""
+        if self._legal_terms_automaton is None:
+            return [term for term in _LEGAL_TERMS if term in text]
+        matched = {term for _, term in self._legal_terms_automaton.iter(text)}
+        return sorted(matched, key=_LEGAL_TERM_ORDER.__getitem__)
+
     def _simplify_question(self, question: str) -> str:
         """简化问题，提取核心内容"""
         # 移除问句标记
@@ -677,58 +1140,47 @@ class TimeSeriesQA:
         return simplified.strip()
     
     def _analyze_question_type(self, question: str) -> str:
-        """分析问题类型"""
-        question_lower = question.lower()
-        
-        # 定义类问题
-        if any(word in question for word in ['是什么', '什么是', '定义', '含义', '概念']):
-            return "definition"
-        
-        # 比较类问题
-        elif any(word in question for word in ['比较', '对比', '区别', '差异', '哪个更好', '哪个更']):
-            return "comparison"
-        
-        # 方法类问题
-        elif any(word in question for word in ['如何', '怎么', '怎样', '方法', '步骤', '怎么做']):
-            return "how_to"
-        
-        # 原因类问题
-        elif any(word in question for word in ['为什么', '原因', '为什么', '为何', '导致']):
-            return "why"
-        
-        # 时间类问题
-        elif any(word in question for word in ['什么时候', '何时', '时间', '历史', '发展']):
-            return "when"
-        
-        # 地点类问题
-        elif any(word in question for word in ['哪里', '在哪', '地点', '位置', '地方']):
-            return "where"
-        
-        # 数量类问题
-        elif any(word in question for word in ['多少', '几个', '数量', '规模', '比例']):
-            return "quantity"
-        
-        else:
+        """分析问题类型（一次扫描找出全部提示词，取优先级最高的类型）"""
+        automaton = self._question_type_automaton
+        if automaton is None:
+            for question_type, words in _QUESTION_TYPE_WORDS:
+                if any(word in question for word in words):
+                    return question_type
             return "general"
-    
+
+        best = min((priority for _, priority in automaton.iter(question)), default=None)
+        return _QUESTION_TYPE_WORDS[best][0] if best is not None else "general"
+
+    @staticmethod
+    def _build_question_type_automaton():
+        """构建问题类型提示词的 Aho-Corasick 自动机，值为类型优先级（未安装 pyahocorasick 时返回 None）"""
+        try:
+            import ahocorasick
+        except ImportError:
+            return None
+        automaton = ahocorasick.Automaton()
+        for priority in range(len(_QUESTION_TYPE_WORDS) - 1, -1, -1):
+            # 倒序添加，同一提示词出现在多个类型中时保留优先级最高者
+            for word in _QUESTION_TYPE_WORDS[priority][1]:
+                automaton.add_word(word, priority)
+        automaton.make_automaton()
+        return automaton
+
     def _extract_keywords_from_question(self, question: str) -> List[str]:
         """从问题中提取关键词"""
         keywords = []
         
-        # 移除常见的停用词
-        stop_words = {'什么', '如何', '怎么', '为什么', '哪个', '哪些', '是', '的', '了', '在', '有', '和', '与', '或', '但', '然而', '因此', '所以', '因为', '如果', '当', '就', '都', '很', '非常', '比较', '更', '最', '还', '也', '又', '再', '已经', '正在', '将要', '可以', '能够', '应该', '必须', '需要', '要求', '希望', '想要', '喜欢', '不喜欢', '认为', '觉得', '知道', '了解', '明白', '理解', '学习', '研究', '分析', '讨论', '介绍', '说明', '解释', '描述', '总结', '概括', '？', '?', '，', ',', '。', '.', '！', '!', '：', ':', '；', ';'}
-        
         # 更智能的关键词提取
         # 1. 提取2-4字的中文词汇
-        words_2_4 = re.findall(r'[\u4e00-\u9fff]{2,4}', question)
+        words_2_4 = _CJK_2_4_RE.findall(question)
         for word in words_2_4:
-            if word not in stop_words:
+            if word not in _QUESTION_STOP_WORDS:
                 keywords.append(word)
         
         # 2. 提取专业术语（5字以上的词）
-        long_words = re.findall(r'[\u4e00-\u9fff]{5,}', question)
+        long_words = _CJK_5_PLUS_RE.findall(question)
         for word in long_words:
-            if word not in stop_words:
+            if word not in _QUESTION_STOP_WORDS:
                 keywords.append(word)
         
         # 3. 按长度和重要性排序
@@ -750,13 +1202,11 @@ class TimeSeriesQA:
         
         # 提取前200个字符中的关键词
         text_sample = context_text[:200]
-        words = re.findall(r'[\u4e00-\u9fff]+', text_sample)
+        words = _CJK_RE.findall(text_sample)
         
         # 过滤和排序
-        stop_words = {'相关', '文档', '相似度', '内容', '信息', '数据', '资料', '报告', '分析', '研究', '调查', '统计', '结果', '结论', '建议', '方法', '技术', '系统', '应用', '发展', '趋势', '问题', '挑战', '机遇', '影响', '作用', '意义', '价值', '重要性', '特点', '优势', '劣势', '优点', '缺点', '好处', '坏处', '风险', '机会', '前景', '未来', '现在', '过去', '历史', '现状', '情况', '状态', '水平', '程度', '范围', '领域', '行业', '市场', '经济', '社会', '政治', '文化', '教育', '科技', '医疗', '健康', '环境', '能源', '交通', '通信', '金融', '投资', '管理', '运营', '生产', '销售', '服务', '客户', '用户', '消费者', '企业', '公司', '组织', '机构', '政府', '部门', '单位', '团队', '个人', '专家', '学者', '研究人员', '分析师', '顾问', '咨询师', '工程师', '设计师', '开发者', '程序员', '产品经理', '项目经理', '销售经理', '市场经理', '人力资源', '财务', '会计', '法律', '律师', '医生', '护士', '教师', '学生', '家长', '孩子', '老人', '年轻人', '男性', '女性', '城市', '农村', '地区', '国家', '国际', '全球', '世界', '中国', '美国', '欧洲', '亚洲', '非洲', '南美洲', '北美洲', '大洋洲', '北京', '上海', '广州', '深圳', '杭州', '南京', '武汉', '成都', '西安', '重庆', '天津', '青岛', '大连', '厦门', '苏州', '无锡', '宁波', '温州', '佛山', '东莞', '中山', '珠海', '江门', '肇庆', '惠州', '汕头', '湛江', '茂名', '韶关', '清远', '阳江', '河源', '梅州', '汕尾', '潮州', '揭阳', '云浮', '广西', '海南', '云南', '贵州', '四川', '重庆', '西藏', '新疆', '青海', '甘肃', '宁夏', '内蒙古', '黑龙江', '吉林', '辽宁', '河北', '山西', '陕西', '河南', '山东', '江苏', '安徽', '浙江', '福建', '江西', '湖南', '湖北', '广东', '台湾', '香港', '澳门'}
-        
         for word in words:
-            if len(word) >= 2 and word not in stop_words:
+            if len(word) >= 2 and word not in _CONTEXT_STOP_WORDS:
                 keywords.append(word)
         
         # 按长度排序
@@ -764,19 +1214,21 @@ class TimeSeriesQA:
         
         return keywords[:3]  # 最多返回3个上下文关键词
 
-    def generate_answer_with_context(self, query: str, context: List[Dict[str, Any]],report: List[Dict[str, Any]]) -> str:
-        """基于上下文生成答案"""
+    def generate_answer_with_context(self, query: str, context: List[Dict[str, Any]],report: List[Dict[str, Any]],
+                                     template: str = None, web_results: List[Dict[str, str]] = None) -> str:
+        """基于上下文生成答案（template / web_results 已由调用方准备好时直接复用）"""
         #读取template文件 TODO
-        try:
-            template = self._read_template_file()
-            print(f"成功读取模板文件: {self.config.ANSWER_TEMPLATE}")
-            print("文件内容为:",template)
-        except FileNotFoundError:
-            print(f"模板文件不存在: {self.config.ANSWER_TEMPLATE}")
-            template = "# 默认模板\n\n这是一个默认的回答模板。"
-        except Exception as e:
-            print(f"读取模板文件时出错: {e}")
-            template = "# 错误\n\n无法加载模板文件。"
+        if template is None:
+            try:
+                template = self._read_template_file()
+                print(f"成功读取模板文件: {self.config.ANSWER_TEMPLATE}")
+                print("文件内容为:",template)
+            except FileNotFoundError:
+                print(f"模板文件不存在: {self.config.ANSWER_TEMPLATE}")
+                template = "# 默认模板\n\n这是一个默认的回答模板。"
+            except Exception as e:
+                print(f"读取模板文件时出错: {e}")
+                template = "# 错误\n\n无法加载模板文件。"
 
         print("数据参考:",report)
 
@@ -788,8 +1240,9 @@ class TimeSeriesQA:
         web_summary = ""
         web_sources = []
         if getattr(self.config, 'WEB_SEARCH_ENABLED', True):
-            search_q = self._build_search_query(query, context_text, template)
-            web_results = self._bing_search(search_q)
+            if web_results is None:
+                search_q = self._build_search_query(query, context_text, template)
+                web_results = self._bing_search(search_q)
             web_summary = self._summarize_web_results(web_results)
             web_sources = web_results
 
@@ -823,25 +1276,28 @@ class TimeSeriesQA:
         except Exception as e:
             return f"生成回答时出错: {str(e)}"
 
-    def generate_answer_without_context(self, query: str) -> str:
+    def generate_answer_without_context(self, query: str, template: str = None,
+                                        web_results: List[Dict[str, str]] = None) -> str:
 
-        try:
-            template = self._read_template_file()
-            print(f"成功读取模板文件: {self.config.ANSWER_TEMPLATE}")
-            print("文件内容为:",template)
-        except FileNotFoundError:
-            print(f"模板文件不存在: {self.config.ANSWER_TEMPLATE}")
-            template = "# 默认模板\n\n这是一个默认的回答模板。"
-        except Exception as e:
-            print(f"读取模板文件时出错: {e}")
-            template = "# 错误\n\n无法加载模板文件。"
+        if template is None:
+            try:
+                template = self._read_template_file()
+                print(f"成功读取模板文件: {self.config.ANSWER_TEMPLATE}")
+                print("文件内容为:",template)
+            except FileNotFoundError:
+                print(f"模板文件不存在: {self.config.ANSWER_TEMPLATE}")
+                template = "# 默认模板\n\n这是一个默认的回答模板。"
+            except Exception as e:
+                print(f"读取模板文件时出错: {e}")
+                template = "# 错误\n\n无法加载模板文件。"
 
         """当没有本地上下文时，使用LLM的一般知识回答，同时加入联网摘要"""
         web_summary = ""
         web_sources = []
         if getattr(self.config, 'WEB_SEARCH_ENABLED', True):
-            search_q = self._build_search_query(query, "", template)
-            web_results = self._bing_search(search_q)
+            if web_results is None:
+                search_q = self._build_search_query(query, "", template)
+                web_results = self._bing_search(search_q)
             web_summary = self._summarize_web_results(web_results)
             web_sources = web_results
 
@@ -887,6 +1343,12 @@ class TimeSeriesQA:
             if not os.path.exists(clean_path):
                 return {"status": "error", "message": f"知识库路径不存在: {clean_path}"}
 
+            # 目录内容未变化时直接复用上次的分析结果
+            fingerprint = self._kb_fingerprint(clean_path)
+            cached = self._kb_stats_cache.get(clean_path)
+            if cached is not None and cached[0] == fingerprint:
+                return cached[1]
+
             # 创建分析器实例
             analyzer = KnowledgeBaseAnalyzer()
 
@@ -907,12 +1369,14 @@ class TimeSeriesQA:
                 print(report)
 
                 # 确保返回完整的报告信息
-                return {
+                result = {
                     "status": "success",
                     "message": "知识库分析完成",
                     "data": report,
                     "stats": stats
                 }
+                self._kb_stats_cache[clean_path] = (fingerprint, result)
+                return result
 
         except Exception as e:
             # 捕获任何未预期的异常
@@ -920,10 +1384,24 @@ class TimeSeriesQA:
             print(error_msg)
             return {"status": "error", "message": error_msg}
 
-    def ask_question(self, question: str, knowledge_base_path: str = None) -> Dict[str, Any]:
-
-        report = self.analyze_knowledge_base(knowledge_base_path)
+    @staticmethod
+    def _kb_fingerprint(path: str) -> tuple:
+        """知识库目录指纹 (最大修改时间, 文件数)；目录的修改时间覆盖了文件删除与重命名"""
+        if os.path.isfile(path):
+            return os.stat(path).st_mtime, 1
+        latest = 0.0
+        count = 0
+        for root, _, files in os.walk(path):
+            latest = max(latest, os.stat(root).st_mtime)
+            for name in files:
+                try:
+                    latest = max(latest, os.stat(os.path.join(root, name)).st_mtime)
+                except OSError:
+                    continue
+                count += 1
+        return latest, count
 
+    def ask_question(self, question: str, knowledge_base_path: str = None) -> Dict[str, Any]:
         """提问并获取答案，可指定知识库路径"""
         # 如果指定了知识库路径且与当前加载的不同，重新构建知识库
         if knowledge_base_path and knowledge_base_path != getattr(self, 'current_knowledge_base', None):
@@ -940,12 +1418,65 @@ class TimeSeriesQA:
                 print(f"切换知识库失败: {e}")
                 # 继续使用当前知识库
 
-        # 搜索相关文档
-        similar_docs = self.search_similar_documents(question)
+        # 回答缓存：相同的问题（开启 ANSWER_CACHE_SEMANTIC 时还包括语义相近的问题）直接复用已生成的回答，
+        # 省去检索与大模型生成
+        answer_key = normalized_query = None
+        if self.config.ANSWER_CACHE_ENABLED:
+            answer_key = (hashlib.sha1(question.strip().encode('utf-8')).hexdigest(), knowledge_base_path)
+            if self.config.ANSWER_CACHE_SEMANTIC:
+                normalized_query = self._normalized_query(self._get_query_embedding(question, answer_key[0]))
+            cached = self._probe_answer_cache(answer_key, normalized_query)
+            if cached is not None:
+                return dict(cached)
+
+        result = self._answer_question(question, knowledge_base_path)
+        if answer_key is not None and not result["answer"].startswith("生成回答时出错"):
+            self._add_to_answer_cache(answer_key, normalized_query, result)
+        return result
+
+    def _probe_answer_cache(self, answer_key: tuple,
+                            normalized_query: Optional[np.ndarray]) -> Optional[Dict[str, Any]]:
+        """先按问题精确匹配；给出问题向量时再在同一知识库的近期问题中查找语义相近（且未过期）的回答"""
+        with self._answer_cache_lock:
+            cached = self._answer_cache.get(answer_key)
+            if cached is not None:
+                return cached
+            index = self._answer_semantic_index
+            if normalized_query is None or index is None or index.ntotal == 0:
+                return None
+            similarities, positions = index.search(normalized_query, min(8, index.ntotal))
+            now = time.monotonic()
+            for similarity, position in zip(similarities[0], positions[0]):
+                if position < 0 or similarity < self.config.ANSWER_CACHE_THRESHOLD:
+                    break
+                kb_path, created_at, result = self._answer_semantic_entries[position]
+                if kb_path == answer_key[1] and now - created_at < self.config.ANSWER_CACHE_TTL:
+                    return result
+        return None
+
+    def _add_to_answer_cache(self, answer_key: tuple, normalized_query: Optional[np.ndarray],
+                             result: Dict[str, Any]):
+        """写入回答缓存（未给出问题向量时只写精确层），语义层超过容量时淘汰最早的条目（FIFO）"""
+        with self._answer_cache_lock:
+            self._answer_cache[answer_key] = result
+            if normalized_query is None:
+                return
+            if self._answer_semantic_index is None:
+                self._answer_semantic_index = faiss.IndexFlatIP(normalized_query.shape[1])
+            if self._answer_semantic_index.ntotal >= self.config.ANSWER_CACHE_SIZE:
+                self._answer_semantic_index.remove_ids(np.array([0], dtype='int64'))
+                self._answer_semantic_entries.pop(0)
+            self._answer_semantic_index.add(normalized_query)
+            self._answer_semantic_entries.append((answer_key[1], time.monotonic(), result))
+
+    def _answer_question(self, question: str, knowledge_base_path: str = None) -> Dict[str, Any]:
+        """检索并生成回答（不经过回答缓存）"""
+        # 搜索相关文档、分析知识库、读取模板与联网搜索（与流式回答共用缓存）
+        similar_docs, report, template, web_results = self._prepare_answer_inputs(question, knowledge_base_path)
 
         if similar_docs:
             # 有相关文档，基于上下文生成答案
-            answer = self.generate_answer_with_context(question, similar_docs, report)
+            answer = self.generate_answer_with_context(question, similar_docs, report, template, web_results)
             confidence = sum(doc["similarity"] for doc in similar_docs) / len(similar_docs)
 
             return {
@@ -958,7 +1489,7 @@ class TimeSeriesQA:
             }
         else:
             # 没有相关文档，使用LLM的一般知识回答
-            answer = self.generate_answer_without_context(question)
+            answer = self.generate_answer_without_context(question, template, web_results)
             web_info = self.search_web_knowledge(question)
 
             return {
@@ -975,6 +1506,7 @@ class TimeSeriesQA:
             if not os.path.exists(knowledge_base_path):
                 return {"success": False, "message": f"知识库路径不存在: {knowledge_base_path}"}
 
+            self._clear_search_caches()
             processed_count = self.build_knowledge_base(knowledge_base_path)
             if processed_count > 0:
                 self.current_knowledge_base = knowledge_base_path
@@ -1012,33 +1544,62 @@ class TimeSeriesQA:
         return available_bases
 
     def _read_template_file(self):
-        """读取模板文件，保持原格式处理"""
+        """读取模板文件，保持原格式处理；按 (路径, 修改时间) 缓存，文件变化后自动重新读取"""
+        template_path = self.config.ANSWER_TEMPLATE
         try:
-            file_ext = os.path.splitext(self.config.ANSWER_TEMPLATE.lower())[1]
-            print(f"读取模板文件: {self.config.ANSWER_TEMPLATE} (格式: {file_ext})")
-
-            # 根据文件类型使用对应读取方法
-            if file_ext in ('.txt', '.md', '.rst', '.markdown'):
-                with open(self.config.ANSWER_TEMPLATE, 'r', encoding='utf-8') as f:
-                    return f.read()
-            elif file_ext == '.csv':
-                return self.processor._load_csv_file(self.config.ANSWER_TEMPLATE)
-            elif file_ext in ('.xlsx', '.xls'):
-                return self.processor._load_excel_file(self.config.ANSWER_TEMPLATE)
-            elif file_ext == '.docx':
-                return self.processor._load_word_file(self.config.ANSWER_TEMPLATE)
-            elif file_ext == '.pdf':
-                return self.processor._load_pdf_file(self.config.ANSWER_TEMPLATE)
-            else:
-                raise ValueError(f"不支持的模板文件格式: {file_ext}")
+            cache_key = (template_path, os.path.getmtime(template_path))
+        except OSError:
+            print(f"模板文件不存在: {template_path}")
+            return "# 默认模板\n\n这是一个默认的回答模板。"
 
+        cached = self._template_cache
+        if cached is not None and cached[0] == cache_key:
+            return cached[1]
+
+        try:
+            content = self._load_template_file(template_path)
         except FileNotFoundError:
-            print(f"模板文件不存在: {self.config.ANSWER_TEMPLATE}")
+            print(f"模板文件不存在: {template_path}")
             return "# 默认模板\n\n这是一个默认的回答模板。"
         except Exception as e:
             print(f"读取模板文件时出错: {e}")
             return "# 错误\n\n无法加载模板文件。"
 
+        self._template_cache = (cache_key, content)
+        return content
+
+    def _system_prompt_prefix(self, template: str) -> str:
+        """返回包含角色与模板的流式回答系统提示；模板未变时复用同一字符串"""
+        cached = self._system_prefix_cache
+        if cached is not None and cached[0] == template:
+            return cached[1]
+        prefix = f"""你是一个社会调研专家。请结合以下数据生成一个司法社会调研报告：
+
+套用模板：
+{template}"""
+        self._system_prefix_cache = (template, prefix)
+        return prefix
+
+    def _load_template_file(self, template_path: str) -> str:
+        """按文件类型读取模板内容"""
+        file_ext = os.path.splitext(template_path.lower())[1]
+        print(f"读取模板文件: {template_path} (格式: {file_ext})")
+
+        # 根据文件类型使用对应读取方法
+        if file_ext in ('.txt', '.md', '.rst', '.markdown'):
+            with open(template_path, 'r', encoding='utf-8') as f:
+                return f.read()
+        elif file_ext == '.csv':
+            return self.processor._load_csv_file(template_path)
+        elif file_ext in ('.xlsx', '.xls'):
+            return self.processor._load_excel_file(template_path)
+        elif file_ext == '.docx':
+            return self.processor._load_word_file(template_path)
+        elif file_ext == '.pdf':
+            return self.processor._load_pdf_file(template_path)
+        else:
+            raise ValueError(f"不支持的模板文件格式: {file_ext}")
+
     def create_session(self, user_id: str = "anonymous", knowledge_base_path: str = None,
                        title: str = "新对话") -> str:
         """创建新的对话会话"""
@@ -1046,8 +1607,39 @@ class TimeSeriesQA:
 
     def get_conversation_history(self, session_id: str, limit: int = 20) -> List[Dict[str, Any]]:
         """从数据库获取对话历史"""
+        self._wait_pending_writes(session_id)
         return self.db_manager.get_conversation_history(session_id, limit)
 
+    def _prepare_answer_inputs(self, question: str, knowledge_base_path: str = None):
+        """并行执行回答前的准备工作，返回 (相似文档, 知识库分析报告, 模板, 联网搜索结果)；结果短期缓存"""
+        cache_key = (question, knowledge_base_path)
+        with self._pipeline_lock:
+            cached = self._pipeline_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        def read_template():
+            try:
+                return self._read_template_file()
+            except Exception:
+                return "# 默认模板\n\n这是一个默认的回答模板。"
+
+        def web_search():
+            if not getattr(self.config, 'WEB_SEARCH_ENABLED', True):
+                return []
+            # 搜索查询只由问题本身决定，无需等待本地检索结果
+            return self._bing_search(self._build_search_query(question, "", ""))
+
+        report_future = self._prep_executor.submit(self.analyze_knowledge_base, knowledge_base_path)
+        template_future = self._prep_executor.submit(read_template)
+        web_future = self._prep_executor.submit(web_search)
+        # 本地检索在请求线程中执行，与上面的任务重叠
+        similar_docs = self.search_similar_documents(question)
+        result = (similar_docs, report_future.result(), template_future.result(), web_future.result())
+        with self._pipeline_lock:
+            self._pipeline_cache[cache_key] = result
+        return result
+
     def stream_answer_sse(self, question: str, knowledge_base_path: str = None,
                           session_id: str = None) -> str:
         """流式生成答案，支持多轮对话，使用数据库存储历史"""
@@ -1058,73 +1650,46 @@ class TimeSeriesQA:
             conversation_history = self.get_conversation_history(session_id)
 
         # 起始帧
-        yield f"data:{json.dumps({'type': 'start', 'session_id': session_id})}\n\n"
+        yield _sse({'type': 'start', 'session_id': session_id})
 
-        # 构建当前对话上下文
-        similar_docs = self.search_similar_documents(question)
-        report = self.analyze_knowledge_base(knowledge_base_path)
+        # 并行准备上下文：相似文档检索、知识库分析、模板读取、联网搜索互不依赖
+        similar_docs, report, template, web_results = self._prepare_answer_inputs(question, knowledge_base_path)
 
-        # 准备系统提示词和上下文
-        try:
-            template = self._read_template_file()
-        except Exception:
-            template = "# 默认模板\n\n这是一个默认的回答模板。"
+        # 系统提示只包含角色与模板这类跨轮次不变的内容，保证多轮对话间前缀逐字节一致，
+        # 便于推理后端复用前缀缓存；检索上下文、数据参考与联网摘要随当前问题放入用户消息
+        system_prompt = self._system_prompt_prefix(template)
 
-        # 构建基础系统提示
-        system_prompt = """你是一个社会调研专家。请结合以下数据生成一个司法社会调研报告："""
-
-        # 执行网络搜索（无论是否有本地文档）
+        # 网络搜索摘要（无论是否有本地文档）
         web_summary = ""
-        web_results = []
         if getattr(self.config, 'WEB_SEARCH_ENABLED', True):
-            # 构建更精准的搜索查询
-            if similar_docs:
-                # 有本地文档时，结合上下文构建查询
-                context_text = "\n\n".join([
-                    f"相关文档 {i + 1} (相似度: {doc['similarity']:.2f}):\n{doc['content']}"
-                    for i, doc in enumerate(similar_docs)
-                ])
-                search_q = self._build_search_query(question, context_text, template)
-            else:
-                # 没有本地文档时，使用问题本身构建查询
-                search_q = self._build_search_query(question, "", template)
-
-            web_results = self._bing_search(search_q)
             web_summary = self._summarize_web_results(web_results)
 
         # 如果有相关文档，添加上下文
-        context_text = ""
         if similar_docs:
             context_text = "\n\n".join([
                 f"相关文档 {i + 1} (相似度: {doc['similarity']:.2f}):\n{doc['content']}"
                 for i, doc in enumerate(similar_docs)
             ])
-            system_prompt += f"""
-
-相关背景知识：
+            user_content = f"""相关背景知识：
 {context_text}
 
-套用模板：
-{template}
-
 数据参考：
 {report}
 
 联网检索摘要（必应国内版）：
 {web_summary}
 
-请使用模板结合背景知识与联网摘要来生成回答，在回答中放入具体数据，保证数据的真实性。"""
+请使用模板结合背景知识与联网摘要来生成回答，在回答中放入具体数据，保证数据的真实性。
+
+用户问题：{question}"""
         else:
             # 没有本地文档时，也要添加网络搜索摘要
-            system_prompt += f"""
-
-套用模板：
-{template}
-
-联网检索摘要（必应国内版）：
+            user_content = f"""联网检索摘要（必应国内版）：
 {web_summary}
 
-请基于你的专业知识与联网摘要提供准确、专业的回答；若为推测或不确定，请说明。"""
+请基于你的专业知识与联网摘要提供准确、专业的回答；若为推测或不确定，请说明。
+
+用户问题：{question}"""
 
         # 构建完整的消息列表
         messages = [{"role": "system", "content": system_prompt}]
@@ -1137,8 +1702,8 @@ class TimeSeriesQA:
         for msg in recent_history:
             messages.append(msg)
 
-        # 添加当前问题
-        messages.append({"role": "user", "content": question})
+        # 添加当前问题及其检索上下文
+        messages.append({"role": "user", "content": user_content})
 
         # 记录知识库使用情况
         if session_id and similar_docs:
@@ -1158,30 +1723,23 @@ class TimeSeriesQA:
                 if token:
                     full_response += token
                     frame = {"type": "chunk", "content": token}
-                    yield f"data:{json.dumps(frame, ensure_ascii=False)}\n\n"
+                    yield _sse(frame)
 
-            # 保存消息到数据库
+            # 保存消息到数据库（后台写入）
             if session_id:
-                # 保存用户问题
-                self.db_manager.add_message(
-                    session_id,
-                    "user",
-                    question,
-                    {"knowledge_base": knowledge_base_path, "timestamp": datetime.now().isoformat()}
-                )
-                # 保存助手回答
-                self.db_manager.add_message(
-                    session_id,
-                    "assistant",
-                    full_response,
-                    {"sources_count": len(similar_docs), "timestamp": datetime.now().isoformat()}
-                )
-
-                # 更新会话标题（如果这是第一轮对话）
+                timestamp = datetime.now().isoformat()
+                # 更新会话标题（如果这是第一轮对话），使用问题前20个字符作为标题
+                title = None
                 if len(conversation_history) == 0:
-                    # 使用问题前20个字符作为标题
                     title = question[:20] + "..." if len(question) > 20 else question
-                    self.db_manager.update_session_title(session_id, title)
+                self._save_turn_async(
+                    session_id,
+                    [
+                        ("user", question, {"knowledge_base": knowledge_base_path, "timestamp": timestamp}),
+                        ("assistant", full_response, {"sources_count": len(similar_docs), "timestamp": timestamp}),
+                    ],
+                    title
+                )
 
             # 末尾补充 meta 信息
             meta = {
@@ -1195,7 +1753,7 @@ class TimeSeriesQA:
                 "conversation_turn": len(conversation_history) // 2 + 1,
                 "web_sources": web_results  # 添加网络搜索来源
             }
-            yield f"data:{json.dumps(meta, ensure_ascii=False)}\n\n"
+            yield _sse(meta)
 
         except Exception as e:
             # 原生流失败时回退到模拟流
@@ -1211,12 +1769,11 @@ class TimeSeriesQA:
             for i in range(0, len(answer_text), chunk_size):
                 chunk = answer_text[i:i + chunk_size]
                 frame = {"type": "chunk", "content": chunk}
-                yield f"data:{json.dumps(frame, ensure_ascii=False)}\n\n"
+                yield _sse(frame)
 
             # 保存消息到数据库
             if session_id:
-                self.db_manager.add_message(session_id, "user", question)
-                self.db_manager.add_message(session_id, "assistant", full_response)
+                self._save_turn_async(session_id, [("user", question, None), ("assistant", full_response, None)])
 
             meta = {
                 "type": "end",
@@ -1227,7 +1784,7 @@ class TimeSeriesQA:
                 "conversation_turn": len(conversation_history) // 2 + 1,
                 "web_sources": web_results  # 添加网络搜索来源
             }
-            yield f"data:{json.dumps(meta, ensure_ascii=False)}\n\n"
+            yield _sse(meta)
 
     def get_user_sessions(self, user_id: str = "anonymous", limit: int = 50) -> List[Dict[str, Any]]:
         """获取用户的会话列表"""
@@ -1237,18 +1794,32 @@ class TimeSeriesQA:
         """关闭会话"""
         self.db_manager.close_session(session_id)
 
-    def get_session_messages(self, session_id: str, limit: int = 100) -> List[Dict[str, Any]]:
-        """获取指定会话的详细消息列表"""
+    def get_session_messages(self, session_id: str, limit: int = 100,
+                             metadata_fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """获取指定会话的详细消息列表
+
+        metadata_fields 指定时，仅在 SQL 中用 JSON_EXTRACT 投影所需的元数据字段，
+        不再把整段 metadata 取回后在 Python 侧解析。
+        """
+        if metadata_fields:
+            fields = tuple(f for f in metadata_fields if _METADATA_FIELD_RE.match(f))
+            sql = _projected_session_messages_sql(fields)
+        else:
+            fields = None
+            sql = _SELECT_SESSION_MESSAGES_SQL
+
+        self._wait_pending_writes(session_id)
         conn = self.db_manager.get_connection()
         try:
             with conn.cursor(dictionary=True) as cursor:
-                sql = """
-                SELECT role, content, metadata, created_at
-                FROM chat_messages
-                WHERE session_id = %s
-                ORDER BY created_at ASC
-                LIMIT %s
-                """
+                # 会话没有新消息时直接返回缓存，省去完整查询和逐行 JSON 解析
+                cursor.execute(_SESSION_MESSAGES_MARKER_SQL, (session_id,))
+                marker = cursor.fetchone()
+                cache_key = (marker["message_count"], marker["last_created_at"], limit, fields)
+                cached = self._session_messages_cache.get(session_id)
+                if cached is not None and cached[0] == cache_key:
+                    return cached[1]
+
                 cursor.execute(sql, (session_id, limit))
                 messages = cursor.fetchall()
 
@@ -1260,17 +1831,83 @@ class TimeSeriesQA:
                         "content": msg["content"],
                         "timestamp": msg["created_at"].isoformat() if msg["created_at"] else None
                     }
-                    if msg["metadata"]:
-                        formatted_msg["metadata"] = json.loads(msg["metadata"])
+                    if fields is not None:
+                        formatted_msg["metadata"] = {field: msg[f"meta_{i}"] for i, field in enumerate(fields)}
+                    elif msg["metadata"]:
+                        # 单行元数据损坏时只跳过该行的元数据，不丢弃整个结果
+                        try:
+                            formatted_msg["metadata"] = json.loads(msg["metadata"])
+                        except (TypeError, ValueError):
+                            logger.warning("会话 %s 的消息元数据解析失败，已跳过", session_id)
                     formatted_messages.append(formatted_msg)
 
+                self._cache_session_messages(session_id, cache_key, formatted_messages)
                 return formatted_messages
-        except Exception as e:
-            print(f"获取会话消息失败: {e}")
+        except Exception:
+            logger.exception("获取会话消息失败: session_id=%s", session_id)
             return []
         finally:
             conn.close()
 
+    def _cache_session_messages(self, session_id: str, cache_key: tuple, messages: List[Dict[str, Any]]):
+        """写入会话消息缓存，超过上限时淘汰最早写入的会话"""
+        self._session_messages_cache.pop(session_id, None)
+        if len(self._session_messages_cache) >= _SESSION_MESSAGES_CACHE_SIZE:
+            self._session_messages_cache.pop(next(iter(self._session_messages_cache)), None)
+        self._session_messages_cache[session_id] = (cache_key, messages)
+
+    def _invalidate_session_messages(self, session_id: str):
+        """会话写入新消息后使其消息缓存失效"""
+        self._session_messages_cache.pop(session_id, None)
+
+    def _save_turn_async(self, session_id: str, messages: List[tuple], title: str = None):
+        """在后台线程中按顺序写入一轮对话消息 (role, content, metadata)，可选更新会话标题
+
+        同一会话的写入按提交顺序执行；下一轮读取会话历史前由 _wait_pending_writes 等待写入完成。
+        """
+        with self._pending_writes_lock:
+            previous = self._pending_writes.get(session_id)
+
+            def save():
+                if previous is not None:
+                    # 前一轮写入先于本轮提交，必然已在执行或排在队列前面
+                    previous.result()
+                self._save_turn(session_id, messages, title)
+
+            future = self._db_executor.submit(save)
+            self._pending_writes[session_id] = future
+        future.add_done_callback(lambda done: self._forget_pending_write(session_id, done))
+
+    def _save_turn(self, session_id: str, messages: List[tuple], title: str = None):
+        """写入一轮对话消息，出错时只记录日志"""
+        try:
+            for role, content, metadata in messages:
+                self.db_manager.add_message(session_id, role, content, metadata)
+            if title:
+                self.db_manager.update_session_title(session_id, title)
+        except Exception:
+            logger.exception("保存对话消息失败: session_id=%s", session_id)
+        finally:
+            self._invalidate_session_messages(session_id)
+
+    def _forget_pending_write(self, session_id: str, future: Future):
+        """写入完成后移除记录（期间已有更新的写入时保留新记录）"""
+        with self._pending_writes_lock:
+            if self._pending_writes.get(session_id) is future:
+                del self._pending_writes[session_id]
+
+    def _wait_pending_writes(self, session_id: str):
+        """等待该会话尚未完成的后台写入，保证随后读到的历史包含上一轮回答"""
+        with self._pending_writes_lock:
+            future = self._pending_writes.get(session_id)
+        if future is not None:
+            future.result()
+
+    def shutdown(self):
+        """关闭后台线程池，等待未完成的数据库写入结束"""
+        self._db_executor.shutdown(wait=True)
+        self._prep_executor.shutdown(wait=True)
+
     # 原有的其他方法保持不变...
     def _ensure_directories_exist(self):
         """确保必要的目录存在"""
@@ -1287,7 +1924,7 @@ class TimeSeriesQA:
             return client
         except ValueError as e:
             if "different settings" in str(e):
-                print("检测到 ChromaDB 设置冲突，正在清理并重新创建...")
+                logger.warning("检测到 ChromaDB 设置冲突，正在清理并重新创建...")
                 if os.path.exists(self.config.CHROMA_DB_PATH):
                     shutil.rmtree(self.config.CHROMA_DB_PATH)
                     os.makedirs(self.config.CHROMA_DB_PATH, exist_ok=True)
@@ -1,15 +1,42 @@
 import os
+import re
 import hashlib
 from datetime import datetime
 
+import xxhash
 
-def get_file_hash(file_path):
-    """计算文件的MD5哈希值"""
-    hash_md5 = hashlib.md5()
+# 计算文件哈希时每次读取的字节数
+_HASH_READ_SIZE = 1024 * 1024
+
+# 句末标点后的空白处切分句子；优先使用 re2（DFA 实现，线性时间无回溯），
+# re2 不支持后行断言，因此匹配“标点+空白”后保留标点
+try:
+    import re2 as _sentence_re
+except ImportError:
+    _sentence_re = re
+_SENTENCE_END_RE = _sentence_re.compile(r'[.!?]\s+')
+
+
+def get_file_hash(file_path, algorithm="xxh3_128"):
+    """计算文件哈希值，仅用于变更检测
+
+    默认使用 xxh3_128（非加密、SIMD 加速）；algorithm="md5" 可得到旧版本记录使用的 MD5 值。
+    """
     with open(file_path, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_md5.update(chunk)
-    return hash_md5.hexdigest()
+        if algorithm == "md5" and hasattr(hashlib, "file_digest"):  # Python 3.11+，在 C 层完成读取与哈希
+            return hashlib.file_digest(f, "md5").hexdigest()
+        hasher = _new_hasher(algorithm)
+        for chunk in iter(lambda: f.read(_HASH_READ_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _new_hasher(algorithm):
+    if algorithm == "xxh3_128":
+        return xxhash.xxh3_128()
+    if algorithm == "md5":
+        return hashlib.md5()
+    raise ValueError(f"不支持的哈希算法: {algorithm}")
 
 
 def format_timestamp(timestamp):
@@ -28,14 +55,25 @@ def safe_join(base_path, *paths):
     return final_path
 
 
+def _split_sentences(text):
+    """在句末标点后的空白处切分文本，句末标点保留在句子中"""
+    sentences = []
+    start = 0
+    for match in _SENTENCE_END_RE.finditer(text):
+        sentences.append(text[start:match.start() + 1])
+        start = match.end()
+    sentences.append(text[start:])
+    return sentences
+
+
 def chunk_text_by_sentences(text, max_words=500, overlap=50):
     """按句子分块文本，保持语义完整性"""
-    import re
-
     # 分割句子
-    sentences = re.split(r'(?<=[.!?])\s+', text)
+    sentences = _split_sentences(text)
     chunks = []
     current_chunk = []
+    # 与 current_chunk 一一对应的分词结果，取重叠部分时无需重新拼接再切分
+    current_words = []
     current_word_count = 0
 
     for sentence in sentences:
@@ -46,21 +84,27 @@ def chunk_text_by_sentences(text, max_words=500, overlap=50):
             # 保存当前块
             chunks.append(' '.join(current_chunk))
 
-            # 保留重叠部分
+            # 保留重叠部分：从末尾的句子向前取足 overlap 个词
             if overlap > 0:
-                overlap_text = ' '.join(current_chunk)
-                overlap_words = overlap_text.split()[-overlap:]
+                overlap_words = []
+                for sentence_words in reversed(current_words):
+                    overlap_words[:0] = sentence_words[-(overlap - len(overlap_words)):]
+                    if len(overlap_words) >= overlap:
+                        break
                 current_chunk = [' '.join(overlap_words)]
+                current_words = [overlap_words]
                 current_word_count = len(overlap_words)
             else:
                 current_chunk = []
+                current_words = []
                 current_word_count = 0
 
         current_chunk.append(sentence)
+        current_words.append(words)
         current_word_count += word_count
 
     # 添加最后一个块
     if current_chunk:
         chunks.append(' '.join(current_chunk))
 
-    return chunks
\ No newline at end of file
+    return chunks
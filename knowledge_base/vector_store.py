@@ -1,20 +1,168 @@
 import faiss
+import hashlib
+import json
+import logging
 import numpy as np
 import pickle
 import os
+import threading
+from collections import OrderedDict
 from config import Config
 
+# 量化索引训练使用的最大样本数
+_MAX_TRAIN_SAMPLES = 100_000
+
+logger = logging.getLogger(__name__)
+
+
+def _check_simd_support():
+    """检查已加载的 FAISS 构建是否包含 AVX2/AVX-512（或 ARM NEON/SVE）内核；标量内核的内积/距离计算约慢 3 倍
+
+    以 get_compile_options() 为准：supported_instruction_sets() 只反映 CPU 支持的指令集，
+    通用构建运行在支持 AVX2 的 CPU 上时同样会列出 AVX2。
+    """
+    compile_options = faiss.get_compile_options()
+    if set(compile_options.upper().split()) & {"AVX2", "AVX512", "AVX512_SPR", "NEON", "SVE"}:
+        return
+    message = f"FAISS 未启用 SIMD 内核（编译选项: {compile_options.strip()}），向量检索将明显变慢"
+    if Config.FAISS_REQUIRE_SIMD:
+        raise RuntimeError(message)
+    logger.warning(message)
+
+
+_check_simd_support()
+
 
 class VectorStore:
     def __init__(self, dimension=None):
         self.dimension = dimension or Config.EMBEDDING_DIMENSION
-        self.index = faiss.IndexFlatL2(self.dimension)
-        self.texts = []
-        self.metadata = []
+        # 外层 IDMap2 为每个向量分配稳定的 int64 ID，删除后其余 ID 不变
+        self.index = faiss.IndexIDMap2(self._create_index())
+        self._next_id = 0
+        # 文本和元数据以向量 ID 为键
+        self.texts = {}
+        self.metadata = {}
+        # 元数据按列存放（键 -> 对象数组），与 self._ids 按插入顺序一一对应，
+        # where 过滤用向量化比较代替逐条字典查找；数组按容量倍增预分配，前 self._size 个元素有效
+        self._ids = np.empty(0, dtype=np.int64)
+        self._meta_columns = {}
+        self._size = 0
+        # 预分配的查询向量缓冲区，search 复用以免每次分配；多线程检索时由锁保护
+        self._query_buf = np.empty((1, self.dimension), dtype='float32')
+        self._search_lock = threading.Lock()
+        # 近期检索结果 LRU 缓存: (查询向量摘要, k, nprobe) -> 结果列表；索引内容变化时清空
+        self._results_cache = OrderedDict()
+        # 索引是否为只读内存映射（MMAP_INDEX 加载），写入前需先把索引文件完整读入内存
+        self._index_read_only = False
+        self._index_path = None
+        # 检索用的 GPU 索引副本（USE_GPU_FAISS），CPU 索引仍是唯一写入与持久化的来源；索引变化后置空重建
+        self._gpu_resources = None
+        self._gpu_index = None
+        self._gpu_unsupported_warned = False
+
+    def _create_index(self):
+        """按 Config.VECTOR_INDEX_TYPE 创建内积度量索引（向量归一化后即为余弦相似度）"""
+        if Config.VECTOR_INDEX_TYPE == "flat":
+            # 精确检索：一次 BLAS 矩阵乘完成全部内积计算
+            return faiss.IndexFlatIP(self.dimension)
+        if self._requires_training():
+            # 训练样本足够前先用精确的平坦索引暂存向量，见 _add_vectors
+            return faiss.IndexFlatIP(self.dimension)
+        if Config.VECTOR_INDEX_TYPE == "sq_fp16":
+            # 输入仍为 float32，由 FAISS 转为 FP16 存储并在 SIMD 内循环中计算
+            return faiss.IndexScalarQuantizer(self.dimension, faiss.ScalarQuantizer.QT_fp16,
+                                              faiss.METRIC_INNER_PRODUCT)
+
+        index = faiss.IndexHNSWFlat(self.dimension, Config.VECTOR_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        return self._set_hnsw_params(index)
+
+    @staticmethod
+    def _set_hnsw_params(index):
+        """设置 HNSW 图索引的构建与检索参数"""
+        index.hnsw.efConstruction = Config.VECTOR_HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = Config.VECTOR_HNSW_EF_SEARCH
+        return index
+
+    def _create_ivfpq_index(self):
+        """创建 IVF-PQ 索引（聚类中心数与 PQ 子空间数取自配置，每个子空间 8 位编码）"""
+        pq_m = min(Config.VECTOR_PQ_M, self.dimension)
+        while self.dimension % pq_m:
+            pq_m -= 1
+        quantizer = faiss.IndexFlatIP(self.dimension)
+        index = faiss.IndexIVFPQ(quantizer, self.dimension, Config.VECTOR_IVF_NLIST, pq_m, 8,
+                                 faiss.METRIC_INNER_PRODUCT)
+        index.nprobe = Config.VECTOR_IVF_NPROBE
+        return index
+
+    def _create_trained_index(self):
+        """创建需用暂存向量训练的量化索引"""
+        if Config.VECTOR_INDEX_TYPE == "ivfpq":
+            return self._create_ivfpq_index()
+        if Config.VECTOR_INDEX_TYPE == "sq8":
+            # SQ8：每维 1 字节，各维取值范围由暂存向量训练得到（归一化向量含负值，不能用 QT_8bit_direct）
+            return faiss.IndexScalarQuantizer(self.dimension, faiss.ScalarQuantizer.QT_8bit,
+                                              faiss.METRIC_INNER_PRODUCT)
+        index = faiss.IndexHNSWSQ(self.dimension, faiss.ScalarQuantizer.QT_8bit,
+                                  Config.VECTOR_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        return self._set_hnsw_params(index)
+
+    @staticmethod
+    def _requires_training():
+        """当前索引类型是否需要训练（IVF-PQ、SQ8 及开启 VECTOR_QUANTIZATION 的 HNSW）"""
+        if Config.VECTOR_INDEX_TYPE in ("ivfpq", "sq8"):
+            return True
+        return Config.VECTOR_INDEX_TYPE not in ("flat", "sq_fp16") and Config.VECTOR_QUANTIZATION
+
+    def _is_staging(self):
+        """需训练的量化索引是否仍处于平坦索引暂存阶段"""
+        return (self._requires_training()
+                and isinstance(faiss.downcast_index(self.index.index), faiss.IndexFlat))
+
+    @staticmethod
+    def _min_train_vectors():
+        """开始训练量化索引所需的最少向量数"""
+        if Config.VECTOR_INDEX_TYPE == "ivfpq":
+            # 每个聚类中心约需 30 个样本；每个 PQ 码本（256 个中心）至少需 256 个样本
+            return max(30 * Config.VECTOR_IVF_NLIST, 256)
+        return Config.VECTOR_SQ_MIN_TRAIN
+
+    def _train_staged_vectors(self):
+        """用暂存的全部向量训练量化索引，并把暂存向量迁入"""
+        ids = faiss.vector_to_array(self.index.id_map)
+        vectors = self.index.index.reconstruct_n(0, self.index.ntotal)
+        index = faiss.IndexIDMap2(self._create_trained_index())
+        # 训练只需代表性样本，向量过多时随机抽取 _MAX_TRAIN_SAMPLES 条
+        train_vectors = vectors
+        if len(vectors) > _MAX_TRAIN_SAMPLES:
+            rng = np.random.default_rng(0)
+            train_vectors = vectors[np.sort(rng.choice(len(vectors), _MAX_TRAIN_SAMPLES, replace=False))]
+        index.train(train_vectors)
+        index.add_with_ids(vectors, ids)
+        self.index = index
+
+    def _ensure_writable(self):
+        """只读内存映射的索引在首次写入前重新完整读入内存
+
+        IVF 索引映射后的倒排表（OnDiskInvertedLists）不支持 clone_index，因此从索引文件重新读取。
+        """
+        if self._index_read_only:
+            self.index = faiss.read_index(self._index_path)
+            self._index_read_only = False
+
+    def _add_vectors(self, vectors, ids):
+        """把向量按指定 ID 加入索引
+
+        IVF-PQ / SQ8 / HNSW-SQ8 在累计向量数达到训练要求前先存入平坦索引，达到后再按配置的参数训练并迁移，
+        避免用过少的首批向量确定聚类中心、码本或各维取值范围（之后的向量会被截断到该范围）。
+        """
+        self._ensure_writable()
+        self.index.add_with_ids(vectors, ids)
+        if self._is_staging() and self.index.ntotal >= self._min_train_vectors():
+            self._train_staged_vectors()
 
     def add_embeddings(self, embeddings, texts, metadata=None):
         """添加嵌入向量到索引"""
-        if not embeddings or not texts:
+        if embeddings is None or len(embeddings) == 0 or not texts:
             return
 
         if metadata is None:
@@ -22,34 +170,164 @@ class VectorStore:
         elif len(metadata) != len(texts):
             metadata = [{}] * len(texts)
 
-        # 转换为numpy数组
-        embeddings = np.array(embeddings).astype('float32')
+        # 转换为numpy数组并归一化（内积即余弦相似度）
+        embeddings = np.array(embeddings, dtype='float32')
+        faiss.normalize_L2(embeddings)
 
-        # 添加到FAISS索引
-        if len(embeddings) > 0:
-            self.index.add(embeddings)
+        # 分配单调递增的 ID 并添加到FAISS索引
+        ids = np.arange(self._next_id, self._next_id + len(embeddings), dtype=np.int64)
+        self._next_id += len(embeddings)
+        self._add_vectors(embeddings, ids)
 
         # 存储文本和元数据
-        self.texts.extend(texts)
-        self.metadata.extend(metadata)
-
-    def search(self, query_embedding, k=5):
-        """搜索最相似的k个结果"""
+        id_list = ids.tolist()
+        self.texts.update(zip(id_list, texts))
+        self.metadata.update(zip(id_list, metadata))
+        self._append_meta_columns(ids, metadata)
+        self._clear_results_cache()
+
+    def _append_meta_columns(self, ids, metadata):
+        """把新增元数据追加到列存储，缺失的键以 None 填充；容量不足时按倍增扩容"""
+        start = self._size
+        end = start + len(metadata)
+        capacity = len(self._ids)
+        if end > capacity:
+            capacity = max(end, capacity * 2, 16)
+            ids_buf = np.empty(capacity, dtype=np.int64)
+            ids_buf[:start] = self._ids[:start]
+            self._ids = ids_buf
+            for key, column in self._meta_columns.items():
+                column_buf = np.full(capacity, None, dtype=object)
+                column_buf[:start] = column[:start]
+                self._meta_columns[key] = column_buf
+
+        keys = set(self._meta_columns)
+        for meta in metadata:
+            keys.update(meta)
+        for key in keys:
+            column = self._meta_columns.get(key)
+            if column is None:
+                column = self._meta_columns[key] = np.full(capacity, None, dtype=object)
+            # 逐个赋值，避免列表类取值被 numpy 当作嵌套维度广播
+            for position, meta in enumerate(metadata, start):
+                column[position] = meta.get(key)
+        self._ids[start:end] = ids
+        self._size = end
+
+    def _rebuild_meta_columns(self):
+        """根据 self.metadata 重建元数据列存储"""
+        self._ids = np.empty(0, dtype=np.int64)
+        self._meta_columns = {}
+        self._size = 0
+        self._append_meta_columns(list(self.metadata.keys()), list(self.metadata.values()))
+
+    def _match_where(self, where):
+        """返回满足 where 条件（键值全部相等）的文档 ID 数组"""
+        size = self._size
+        mask = np.ones(size, dtype=bool)
+        for key, value in where.items():
+            column = self._meta_columns.get(key)
+            if column is None:
+                # 没有任何文档含该键，等价于值为 None
+                if value is not None:
+                    return np.empty(0, dtype=np.int64)
+                continue
+            column = column[:size]
+            if isinstance(value, (list, dict, tuple)):
+                # 容器类型的值无法直接广播比较，逐个比较
+                matches = np.fromiter((item == value for item in column), dtype=bool, count=len(column))
+            else:
+                matches = column == value
+            mask &= matches
+        return self._ids[:size][mask]
+
+    def search(self, query_embedding, k=5, nprobe=None):
+        """搜索最相似的k个结果；nprobe 仅对 IVF 索引生效，指定检索时探测的倒排桶数"""
         if len(self.texts) == 0:
             return []
 
         k = min(k, len(self.texts))
-        query_embedding = np.array([query_embedding]).astype('float32')
-        distances, indices = self.index.search(query_embedding, k)
+        query = np.asarray(query_embedding, dtype='float32').reshape(-1)
+        cache_key = (hashlib.blake2b(query.tobytes(), digest_size=16).digest(), k, nprobe)
+        with self._search_lock:
+            cached = self._results_cache.get(cache_key)
+            if cached is not None:
+                self._results_cache.move_to_end(cache_key)
+                return list(cached)
+
+            np.copyto(self._query_buf[0], query)
+            faiss.normalize_L2(self._query_buf)
+            similarities, indices = self._search_index(nprobe).search(self._query_buf, k)
+
+            results = self._format_results(similarities[0], indices[0])
+            self._results_cache[cache_key] = results
+            if len(self._results_cache) > Config.VECTOR_SEARCH_CACHE_SIZE:
+                self._results_cache.popitem(last=False)
+
+        return list(results)
+
+    def _clear_results_cache(self):
+        """索引内容变化后清空检索结果缓存并作废 GPU 索引副本"""
+        with self._search_lock:
+            self._results_cache.clear()
+            self._gpu_index = None
+
+    def _search_index(self, nprobe=None):
+        """返回用于检索的索引（调用方持有 _search_lock）：满足条件时使用按需复制的 GPU 副本，否则为 CPU 索引
+
+        IVF 索引同时设置本次检索的 nprobe。
+        """
+        is_ivf = Config.VECTOR_INDEX_TYPE == "ivfpq" and not self._is_staging()
+        if (not Config.USE_GPU_FAISS or self.index.ntotal < Config.GPU_FAISS_MIN_VECTORS
+                or not hasattr(faiss, "StandardGpuResources") or faiss.get_num_gpus() == 0
+                or not self._gpu_supported()):
+            if is_ivf:
+                faiss.extract_index_ivf(self.index).nprobe = nprobe or Config.VECTOR_IVF_NPROBE
+            return self.index
+
+        if self._gpu_index is None:
+            if self._gpu_resources is None:
+                self._gpu_resources = faiss.StandardGpuResources()
+            self._gpu_index = faiss.index_cpu_to_gpu(self._gpu_resources, 0, self.index)
+        if is_ivf:
+            faiss.GpuParameterSpace().set_index_parameter(
+                self._gpu_index, "nprobe", nprobe or Config.VECTOR_IVF_NPROBE)
+        return self._gpu_index
+
+    def _gpu_supported(self):
+        """当前索引能否复制到 GPU：GPU FAISS 只支持平坦与 IVF 索引，HNSW 和非 IVF 的标量量化索引留在 CPU"""
+        if isinstance(faiss.downcast_index(self.index.index), (faiss.IndexFlat, faiss.IndexIVF)):
+            return True
+        if not self._gpu_unsupported_warned:
+            logger.warning("GPU FAISS 不支持索引类型 %s，检索使用 CPU 索引", Config.VECTOR_INDEX_TYPE)
+            self._gpu_unsupported_warned = True
+        return False
 
+    def search_batch(self, query_embeddings, k=5, nprobe=None):
+        """批量搜索：B 个查询一次送入 FAISS（一次矩阵乘代替 B 次向量乘），返回每个查询的结果列表"""
+        queries = np.array(query_embeddings, dtype='float32', ndmin=2)
+        if len(self.texts) == 0 or len(queries) == 0:
+            return [[] for _ in range(len(queries))]
+
+        k = min(k, len(self.texts))
+        faiss.normalize_L2(queries)
+        with self._search_lock:
+            similarities, indices = self._search_index(nprobe).search(queries, k)
+
+        return [self._format_results(similarities[row], indices[row]) for row in range(len(queries))]
+
+    def _format_results(self, similarities, indices):
+        """把单个查询的 FAISS 检索结果转换为结果字典列表"""
         results = []
-        for i, idx in enumerate(indices[0]):
-            if idx < len(self.texts) and idx >= 0:  # 确保索引有效
+        for i, idx in enumerate(indices):
+            idx = int(idx)
+            if idx in self.texts:  # 确保ID有效（-1 表示结果不足）
+                similarity = float(similarities[i])  # 内积即余弦相似度
                 results.append({
                     'text': self.texts[idx],
                     'metadata': self.metadata[idx],
-                    'distance': float(distances[0][i]),
-                    'similarity': float(1 - distances[0][i])  # 添加相似度分数
+                    'distance': 1 - similarity,  # 余弦距离
+                    'similarity': similarity
                 })
 
         return results
@@ -60,31 +338,101 @@ class VectorStore:
             # 保存FAISS索引
             faiss.write_index(self.index, f"{file_path}.index")
 
-            # 保存文本和元数据
-            with open(f"{file_path}.data", 'wb') as f:
-                pickle.dump({
-                    'texts': self.texts,
-                    'metadata': self.metadata,
-                    'dimension': self.dimension
-                }, f)
+            # 保存文本和元数据：优先写列式 Parquet 文件，未安装 pyarrow 时回退到 pickle（协议 5，分帧流式写入文件）
+            if self._save_parquet(file_path):
+                stale_path = f"{file_path}.data"
+            else:
+                with open(f"{file_path}.data", 'wb') as f:
+                    pickle.dump({
+                        'texts': self.texts,
+                        'metadata': self.metadata,
+                        'next_id': self._next_id,
+                        'dimension': self.dimension
+                    }, f, protocol=5)
+                stale_path = f"{file_path}.parquet"
+            # 删除另一种格式的旧文件，避免加载时读到过期数据（load 优先读取 Parquet）
+            if os.path.exists(stale_path):
+                os.remove(stale_path)
             return True
         except Exception as e:
             print(f"保存向量存储失败: {e}")
             return False
 
+    def _save_parquet(self, file_path):
+        """把文本和元数据写为 Parquet 文件，未安装 pyarrow 时返回 False"""
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            return False
+
+        ids = list(self.texts.keys())
+        table = pa.Table.from_pydict(
+            {
+                'id': pa.array(ids, type=pa.int64()),
+                'text': [self.texts[i] for i in ids],
+                'meta': [json.dumps(self.metadata[i], ensure_ascii=False) for i in ids],
+            },
+            metadata={'next_id': str(self._next_id), 'dimension': str(self.dimension)}
+        )
+        pq.write_table(table, f"{file_path}.parquet")
+        return True
+
+    def _load_parquet(self, file_path):
+        """从 Parquet 文件读取文本和元数据（内存映射读取），文件不存在或未安装 pyarrow 时返回 None"""
+        if not os.path.exists(f"{file_path}.parquet"):
+            return None
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            return None
+
+        table = pq.read_table(f"{file_path}.parquet", memory_map=True)
+        ids = table.column('id').to_pylist()
+        schema_meta = table.schema.metadata or {}
+        return {
+            'texts': dict(zip(ids, table.column('text').to_pylist())),
+            'metadata': dict(zip(ids, (json.loads(m) for m in table.column('meta').to_pylist()))),
+            'next_id': int(schema_meta.get(b'next_id', max(ids, default=-1) + 1)),
+            'dimension': int(schema_meta[b'dimension']) if b'dimension' in schema_meta else self.dimension,
+        }
+
     def load(self, file_path):
         """从文件加载向量存储"""
         try:
-            # 加载FAISS索引
-            self.index = faiss.read_index(f"{file_path}.index")
+            # 加载FAISS索引；MMAP_INDEX 时以只读方式内存映射，向量由页缓存按需载入并在多进程间共享
+            io_flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if Config.MMAP_INDEX else 0
+            self.index = faiss.read_index(f"{file_path}.index", io_flags)
+            self._index_path = f"{file_path}.index"
+            self._index_read_only = Config.MMAP_INDEX
 
             # 加载文本和元数据
-            with open(f"{file_path}.data", 'rb') as f:
-                data = pickle.load(f)
-                self.texts = data['texts']
-                self.metadata = data['metadata']
-                if 'dimension' in data:
-                    self.dimension = data['dimension']
+            data = self._load_parquet(file_path)
+            if data is None:
+                with open(f"{file_path}.data", 'rb') as f:
+                    data = pickle.load(f)
+            texts = data['texts']
+            metadata = data['metadata']
+            if 'dimension' in data:
+                self.dimension = data['dimension']
+                self._query_buf = np.empty((1, self.dimension), dtype='float32')
+
+            if isinstance(texts, list):
+                # 旧格式：列表按位置对应向量，转换为以位置为 ID 的字典并重建带 ID 的索引
+                self.texts = dict(enumerate(texts))
+                self.metadata = dict(enumerate(metadata))
+                self._next_id = len(texts)
+                if not isinstance(self.index, faiss.IndexIDMap2):
+                    vectors = self.index.reconstruct_n(0, self.index.ntotal)
+                    self.index = faiss.IndexIDMap2(self._create_index())
+                    self._index_read_only = False
+                    self._add_vectors(vectors, np.arange(len(vectors), dtype=np.int64))
+            else:
+                self.texts = texts
+                self.metadata = metadata
+                self._next_id = data.get('next_id', max(texts, default=-1) + 1)
+            self._rebuild_meta_columns()
+            self._clear_results_cache()
             return True
         except Exception as e:
             print(f"加载向量存储失败: {e}")
@@ -127,41 +475,29 @@ class VectorStore:
 
         # 根据where条件过滤文档
         if where:
-            # 找到匹配的索引
-            matched_indices = []
-            for i, meta in enumerate(self.metadata):
-                match = True
-                for key, value in where.items():
-                    if meta.get(key) != value:
-                        match = False
-                        break
-                if match:
-                    matched_indices.append(i)
+            # 找到匹配的ID
+            matched_ids = self._match_where(where).tolist()
 
             # 构建结果
-            results['ids'] = [str(i) for i in matched_indices]
+            results['ids'] = [str(i) for i in matched_ids]
             if "documents" in include:
-                results['documents'] = [self.texts[i] for i in matched_indices]
+                results['documents'] = [self.texts[i] for i in matched_ids]
             if "metadatas" in include:
-                results['metadatas'] = [self.metadata[i] for i in matched_indices]
-            if "embeddings" in include and hasattr(self.index, 'reconstruct'):
+                results['metadatas'] = [self.metadata[i] for i in matched_ids]
+            if "embeddings" in include:
                 try:
-                    embeddings = []
-                    for i in matched_indices:
-                        embedding = self.index.reconstruct(i)
-                        embeddings.append(embedding)
-                    results['embeddings'] = embeddings
+                    results['embeddings'] = [self.index.reconstruct(i) for i in matched_ids]
                 except:
                     results['embeddings'] = []
         else:
             # 返回所有文档
-            results['ids'] = [str(i) for i in range(len(self.texts))]
+            results['ids'] = [str(i) for i in self.texts]
             if "documents" in include:
-                results['documents'] = self.texts[:]
+                results['documents'] = list(self.texts.values())
             if "metadatas" in include:
-                results['metadatas'] = self.metadata[:]
+                results['metadatas'] = list(self.metadata.values())
             if "embeddings" in include:
-                results['embeddings'] = []  # FAISS IndexFlatL2不支持直接获取向量
+                results['embeddings'] = []  # 未指定条件时不批量重建向量
 
         return results
 
@@ -176,43 +512,57 @@ class VectorStore:
         Returns:
             删除操作的结果
         """
-        indices_to_delete = set()
+        ids_to_delete = set()
 
         # 根据ids删除
         if ids:
             for id_str in ids:
                 try:
                     idx = int(id_str)
-                    if 0 <= idx < len(self.texts):
-                        indices_to_delete.add(idx)
+                    if idx in self.texts:
+                        ids_to_delete.add(idx)
                 except (ValueError, TypeError):
                     continue
 
         # 根据where条件删除
         if where:
-            for i, meta in enumerate(self.metadata):
-                match = True
-                for key, value in where.items():
-                    if meta.get(key) != value:
-                        match = False
-                        break
-                if match:
-                    indices_to_delete.add(i)
-
-        if not indices_to_delete:
+            ids_to_delete.update(self._match_where(where).tolist())
+
+        if not ids_to_delete:
             return {"success": True, "deleted_count": 0}
 
-        # 转换为排序列表（降序），便于删除
-        sorted_indices = sorted(list(indices_to_delete), reverse=True)
+        delete_array = np.fromiter(ids_to_delete, dtype=np.int64, count=len(ids_to_delete))
+        self._remove_vectors(delete_array)
 
         # 删除文档和元数据
-        for idx in sorted_indices:
-            if idx < len(self.texts):
-                self.texts.pop(idx)
-                self.metadata.pop(idx)
-
-        # 注意：FAISS索引中的向量无法轻易删除，需要重建索引
-        # 这里只是简单地清空索引，实际使用中可能需要更好的解决方案
-        print("注意：FAISS索引中的向量删除需要重建索引")
-
-        return {"success": True, "deleted_count": len(indices_to_delete)}
+        for idx in ids_to_delete:
+            self.texts.pop(idx, None)
+            self.metadata.pop(idx, None)
+        # 在预分配的数组内原地压缩，腾出的尾部置空以释放对象引用
+        size = self._size
+        keep = ~np.isin(self._ids[:size], delete_array)
+        kept = int(keep.sum())
+        self._ids[:kept] = self._ids[:size][keep]
+        for column in self._meta_columns.values():
+            column[:kept] = column[:size][keep]
+            column[kept:size] = None
+        self._size = kept
+        self._clear_results_cache()
+
+        return {"success": True, "deleted_count": len(ids_to_delete)}
+
+    def _remove_vectors(self, delete_ids):
+        """从索引中移除指定 ID 的向量；底层索引不支持删除（如 HNSW）时用剩余向量重建"""
+        self._ensure_writable()
+        try:
+            self.index.remove_ids(delete_ids)
+            return
+        except RuntimeError:
+            pass
+
+        all_ids = faiss.vector_to_array(self.index.id_map)
+        keep = ~np.isin(all_ids, delete_ids)
+        vectors = self.index.index.reconstruct_n(0, self.index.ntotal)[keep]
+        self.index = faiss.IndexIDMap2(self._create_index())
+        if len(vectors) > 0:
+            self._add_vectors(vectors, all_ids[keep])
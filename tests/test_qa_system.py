@@ -21,5 +21,29 @@ class TestQASystem(unittest.TestCase):
         self.assertIn('answer', result)
 
 
+class TestBingResultParsing(unittest.TestCase):
+    """必应结果页正则回退解析"""
+
+    PAGE = (
+        '<ol id="b_results">'
+        '<li class="b_algo"><h2><a href="https://www.bing.com/ck/a?!&amp;&amp;p=abc&amp;u=a1aHR0cHM">'
+        '时间序列分析入门</a></h2><p>跳转链接</p></li>'
+        '<li class="b_algo"><h2><a href="https://example.com/arima">ARIMA 模型详解</a></h2>'
+        '<p>ARIMA 是常用的时间序列模型</p></li>'
+        '</ol>'
+    )
+
+    def test_skips_bing_tracking_links(self):
+        """测试 bing.com/ck 跳转链接被过滤，只保留直接结果"""
+        results = TimeSeriesQA._regex_parse_bing_results(self.PAGE, 5)
+        self.assertEqual([r['link'] for r in results], ['https://example.com/arima'])
+        self.assertEqual(results[0]['title'], 'ARIMA 模型详解')
+
+    def test_respects_topn(self):
+        """测试结果数不超过 topn"""
+        page = ''.join(f'<h2><a href="https://example.com/{i}">结果标题 {i}</a></h2>' for i in range(10))
+        self.assertEqual(len(TimeSeriesQA._regex_parse_bing_results(page, 3)), 3)
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,206 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import DEFAULT, Mock, patch
+
+import faiss
+import numpy as np
+
+from config import Config
+from knowledge_base.vector_store import VectorStore, _check_simd_support
+
+
+class TestVectorStorePersistence(unittest.TestCase):
+    """保存 -> 加载 -> 增删 的往返测试，覆盖各索引类型及内存映射加载"""
+
+    DIMENSION = 16
+    # (VECTOR_INDEX_TYPE, VECTOR_QUANTIZATION)
+    INDEX_TYPES = [
+        ("flat", False),
+        ("hnsw", False),
+        ("hnsw", True),
+        ("ivfpq", False),
+        ("sq_fp16", False),
+        ("sq8", False),
+    ]
+
+    def setUp(self):
+        """测试前设置"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.rng = np.random.default_rng(0)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _round_trip(self, index_type, quantization, mmap_index):
+        with patch.multiple(Config, VECTOR_INDEX_TYPE=index_type, VECTOR_QUANTIZATION=quantization,
+                            MMAP_INDEX=mmap_index, USE_GPU_FAISS=False,
+                            VECTOR_IVF_NLIST=4, VECTOR_PQ_M=4, VECTOR_SQ_MIN_TRAIN=200):
+            store = VectorStore(dimension=self.DIMENSION)
+            embeddings = self.rng.standard_normal((300, self.DIMENSION)).astype('float32')
+            store.add_embeddings(embeddings, [f"doc{i}" for i in range(300)],
+                                 [{"group": i % 3} for i in range(300)])
+
+            file_path = os.path.join(self.tmp_dir, f"{index_type}_{quantization}_{mmap_index}")
+            self.assertTrue(store.save(file_path))
+
+            loaded = VectorStore(dimension=self.DIMENSION)
+            self.assertTrue(loaded.load(file_path))
+            self.assertEqual(loaded.delete(where={"group": 0})["deleted_count"], 100)
+
+            extra = self.rng.standard_normal((10, self.DIMENSION)).astype('float32')
+            loaded.add_embeddings(extra, [f"new{i}" for i in range(10)])
+            self.assertEqual(loaded.index.ntotal, 210)
+            self.assertEqual(loaded.search(extra[0], k=1)[0]['text'], "new0")
+            self.assertEqual(loaded.get(where={"group": 0})['ids'], [])
+
+    def test_save_removes_stale_sibling_format(self):
+        """测试回退到 pickle 保存时删除旧的 Parquet 文件，加载读到的是最新数据"""
+        with patch.multiple(Config, VECTOR_INDEX_TYPE="flat", MMAP_INDEX=False, USE_GPU_FAISS=False):
+            store = VectorStore(dimension=self.DIMENSION)
+            embeddings = self.rng.standard_normal((4, self.DIMENSION)).astype('float32')
+            store.add_embeddings(embeddings[:3], ["doc0", "doc1", "doc2"])
+            file_path = os.path.join(self.tmp_dir, "stale")
+            self.assertTrue(store.save(file_path))
+
+            store.add_embeddings(embeddings[3:], ["doc3"])
+            with patch.object(VectorStore, "_save_parquet", return_value=False):
+                self.assertTrue(store.save(file_path))
+            self.assertFalse(os.path.exists(f"{file_path}.parquet"))
+
+            loaded = VectorStore(dimension=self.DIMENSION)
+            self.assertTrue(loaded.load(file_path))
+            self.assertEqual(sorted(loaded.texts.values()), ["doc0", "doc1", "doc2", "doc3"])
+
+    def test_round_trip(self):
+        """测试各索引类型保存后重新加载仍可删除和添加"""
+        for index_type, quantization in self.INDEX_TYPES:
+            with self.subTest(index_type=index_type, quantization=quantization):
+                self._round_trip(index_type, quantization, mmap_index=False)
+
+    def test_round_trip_mmap(self):
+        """测试 MMAP_INDEX 只读映射加载后首次写入前转为可写索引"""
+        for index_type, quantization in self.INDEX_TYPES:
+            with self.subTest(index_type=index_type, quantization=quantization):
+                self._round_trip(index_type, quantization, mmap_index=True)
+
+
+class TestVectorStoreTraining(unittest.TestCase):
+    """量化索引在向量足够后才训练"""
+
+    DIMENSION = 16
+
+    def setUp(self):
+        """测试前设置"""
+        self.rng = np.random.default_rng(0)
+
+    def _add(self, store, count):
+        embeddings = self.rng.standard_normal((count, self.DIMENSION)).astype('float32')
+        start = store._next_id
+        store.add_embeddings(embeddings, [f"doc{i}" for i in range(start, start + count)])
+        return embeddings
+
+    def test_ivfpq_deferred_training(self):
+        """测试 IVF-PQ 先暂存于平坦索引，达到 30*nlist 条后按配置的 nlist 训练"""
+        with patch.multiple(Config, VECTOR_INDEX_TYPE="ivfpq", USE_GPU_FAISS=False,
+                            VECTOR_IVF_NLIST=10, VECTOR_PQ_M=4):
+            store = VectorStore(dimension=self.DIMENSION)
+            first = self._add(store, 1)
+            self.assertTrue(store._is_staging())
+            self.assertEqual(store.search(first[0], k=1)[0]['text'], "doc0")
+
+            self._add(store, 298)
+            self.assertTrue(store._is_staging())
+            self._add(store, 1)
+            self.assertFalse(store._is_staging())
+
+            ivf = faiss.extract_index_ivf(store.index)
+            self.assertEqual(ivf.nlist, 10)
+            self.assertEqual(faiss.downcast_index(store.index.index).pq.nbits, 8)
+            self.assertEqual(store.index.ntotal, 300)
+            self.assertEqual(store.search(first[0], k=1)[0]['text'], "doc0")
+
+
+    def _check_sq8_deferred_training(self, index_class):
+        store = VectorStore(dimension=self.DIMENSION)
+        self._add(store, 10)
+        self.assertTrue(store._is_staging())
+        self._add(store, 90)
+        self.assertFalse(store._is_staging())
+        self.assertIsInstance(faiss.downcast_index(store.index.index), index_class)
+
+        later = self._add(store, 50)
+        hit = store.search(later[0], k=1)[0]
+        self.assertEqual(hit['text'], "doc100")
+        self.assertGreater(hit['similarity'], 0.95)
+
+    def test_sq8_deferred_training(self):
+        """测试 SQ8 达到 VECTOR_SQ_MIN_TRAIN 条后才训练取值范围，之后添加的向量不失真"""
+        with patch.multiple(Config, VECTOR_INDEX_TYPE="sq8", USE_GPU_FAISS=False, VECTOR_SQ_MIN_TRAIN=100):
+            self._check_sq8_deferred_training(faiss.IndexScalarQuantizer)
+
+    def test_hnsw_sq8_deferred_training(self):
+        """测试 HNSW-SQ8 同样在达到 VECTOR_SQ_MIN_TRAIN 条后才训练"""
+        with patch.multiple(Config, VECTOR_INDEX_TYPE="hnsw", VECTOR_QUANTIZATION=True,
+                            USE_GPU_FAISS=False, VECTOR_SQ_MIN_TRAIN=100):
+            self._check_sq8_deferred_training(faiss.IndexHNSWSQ)
+
+class TestGpuSearch(unittest.TestCase):
+    """GPU 检索只用于平坦与 IVF 索引"""
+
+    DIMENSION = 16
+
+    def _search_with_gpu(self, index_type):
+        gpu_patches = {
+            "StandardGpuResources": DEFAULT,
+            "get_num_gpus": Mock(return_value=1),
+            # 以 CPU 索引充当 GPU 副本，只验证是否尝试复制
+            "index_cpu_to_gpu": Mock(side_effect=lambda res, device, index: index),
+        }
+        with patch.multiple(Config, VECTOR_INDEX_TYPE=index_type, VECTOR_QUANTIZATION=False,
+                            USE_GPU_FAISS=True, GPU_FAISS_MIN_VECTORS=1), \
+                patch.multiple(faiss, create=True, **gpu_patches):
+            store = VectorStore(dimension=self.DIMENSION)
+            embeddings = np.random.default_rng(0).standard_normal((20, self.DIMENSION)).astype('float32')
+            store.add_embeddings(embeddings, [f"doc{i}" for i in range(20)])
+            self.assertEqual(store.search(embeddings[3], k=1)[0]['text'], "doc3")
+            return faiss.index_cpu_to_gpu.called
+
+    def test_flat_uses_gpu(self):
+        """测试平坦索引复制到 GPU"""
+        self.assertTrue(self._search_with_gpu("flat"))
+
+    def test_unsupported_index_stays_on_cpu(self):
+        """测试 HNSW 与标量量化索引不复制到 GPU"""
+        for index_type in ("hnsw", "sq_fp16"):
+            with self.subTest(index_type=index_type):
+                self.assertFalse(self._search_with_gpu(index_type))
+
+
+class TestSimdCheck(unittest.TestCase):
+    """FAISS SIMD 内核检查以编译选项为准"""
+
+    def test_generic_build_warns(self):
+        """测试通用构建（无 AVX2/AVX-512）时记录警告"""
+        with patch.object(faiss, "get_compile_options", return_value="OPTIMIZE GENERIC "), \
+                patch.object(Config, "FAISS_REQUIRE_SIMD", False):
+            with self.assertLogs("knowledge_base.vector_store", level="WARNING"):
+                _check_simd_support()
+
+    def test_generic_build_raises_when_required(self):
+        """测试 FAISS_REQUIRE_SIMD 开启时通用构建直接报错"""
+        with patch.object(faiss, "get_compile_options", return_value="OPTIMIZE GENERIC "), \
+                patch.object(Config, "FAISS_REQUIRE_SIMD", True):
+            with self.assertRaises(RuntimeError):
+                _check_simd_support()
+
+    def test_avx2_build_passes(self):
+        """测试 AVX2 构建不报错"""
+        with patch.object(faiss, "get_compile_options", return_value="OPTIMIZE AVX2 "), \
+                patch.object(Config, "FAISS_REQUIRE_SIMD", True):
+            _check_simd_support()
+
+
+if __name__ == '__main__':
+    unittest.main()